@@ -0,0 +1,144 @@
+# carbon_store.py
+"""
+Lazy, filtered access to the local carbon datasets.
+
+    import carbon_store
+    rel = carbon_store.open("hourly", zones=["US-NY-NYIS"], start="2024-03-01", end="2024-03-08")
+    df = rel.df()        # nothing is read until the relation is materialized
+
+Both on-disk layouts are served by the same call:
+- source="ingest": ingest.py output,       data/granularity=<g>/zone=<z>/year=<y>/*.parquet
+- source="big":    consolidate.py output,  datasets/big/frequency=<g>/region=<z>/year=<y>/data.parquet
+
+open() returns a DuckDB relation. The zone and time filters and the column list
+are pushed into the Parquet scan, so DuckDB skips partitions (zone/year in the
+path) and row groups (datetime_utc statistics) and reads only the requested
+columns. Materialize with .df() (pandas), .arrow() or .pl(), or keep composing
+with .filter() / .aggregate().
+
+ingest.py appends refetched windows as part files next to data.parquet, so a
+partition can hold the same hour twice until it is compacted. open() keeps one
+row per (datetime_utc, zone) inside the relation, preferring part files over
+data.parquet and later spans over earlier ones; the files themselves are only
+rewritten by the writer (ingest.py), so open() never touches the directory.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import duckdb
+import pandas as pd
+
+import partitions
+
+
+# ---------- Config ----------
+SOURCES = {                      # source -> (root, granularity key, zone key, has part files)
+    "ingest": (Path("data"), "granularity", "zone", True),
+    "big": (Path("datasets/big"), "frequency", "region", False),
+}
+GRANULARITIES = ("hourly", "daily", "monthly", "yearly")
+
+TimeLike = Union[str, pd.Timestamp, None]
+
+_con: Optional[duckdb.DuckDBPyConnection] = None
+
+
+# ---------- Helpers ----------
+def connection() -> duckdb.DuckDBPyConnection:
+    """Shared in-process connection; timestamps are compared and shown in UTC."""
+    global _con
+    if _con is None:
+        _con = duckdb.connect()
+        _con.execute("SET TimeZone = 'UTC'")
+    return _con
+
+def sql_str(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def sql_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def to_utc(value: TimeLike) -> Optional[pd.Timestamp]:
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+def compact_pending(level_dir: Path, zone_col: str, zones: Optional[Iterable[str]],
+                    first_year: Optional[int], last_year: Optional[int]):
+    """Compact the zone/year partitions in range that still hold part files."""
+    zone_globs = ["*"] if zones is None else [str(z) for z in zones]
+    for z in zone_globs:
+        for part_dir in level_dir.glob(f"{zone_col}={z}/year=*"):
+            year = int(part_dir.name.split("=", 1)[1])
+            if (first_year is not None and year < first_year) or (last_year is not None and year > last_year):
+                continue
+            if next(part_dir.glob("part-*.parquet"), None) is not None:
+                partitions.compact_partition(part_dir, ["datetime_utc", zone_col])
+
+
+# ---------- API ----------
+def open(granularity: str, zones: Optional[Iterable[str]] = None, start: TimeLike = None,
+         end: TimeLike = None, columns: Optional[Iterable[str]] = None, source: str = "ingest",
+         base_dir: Optional[Path] = None, compact: bool = False) -> duckdb.DuckDBPyRelation:
+    """
+    Lazy relation over one granularity of a dataset.
+
+    Args:
+        granularity: "hourly", "daily", "monthly" or "yearly"
+        zones: Zone ids to keep (e.g. ["US-NY-NYIS"]); None for all
+        start: Inclusive lower bound on datetime_utc (naive values are UTC)
+        end: Exclusive upper bound on datetime_utc
+        columns: Columns to return; None for all
+        source: "ingest" (data/) or "big" (datasets/big/)
+        base_dir: Override the source's root directory
+        compact: Compact the selected partitions that hold part files before the
+            scan. Rewrites files: only when no ingest runs at the same time.
+
+    Returns:
+        duckdb relation (materialize with .df() / .arrow())
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}; expected one of {GRANULARITIES}.")
+    if source not in SOURCES:
+        raise ValueError(f"Unknown source {source!r}; expected one of {tuple(SOURCES)}.")
+    root, level, zone_col, has_parts = SOURCES[source]
+    root = Path(base_dir) if base_dir is not None else root
+    zones = None if zones is None else list(zones)
+    start, end = to_utc(start), to_utc(end)
+    last_year = None if end is None else (end - pd.Timedelta(microseconds=1)).year
+
+    level_dir = root / f"{level}={granularity}"
+    if compact:
+        compact_pending(level_dir, zone_col, zones, None if start is None else start.year, last_year)
+
+    # zone/year terms prune hive partitions, datetime_utc terms prune row groups;
+    # union_by_name widens each column over all files (older parts hold int64 / null
+    # columns where newer ones hold float64 / string) instead of taking the first file's
+    filters = []
+    if zones is not None:
+        filters.append(f"{zone_col} IN ({', '.join(sql_str(z) for z in zones)})")
+    if start is not None:
+        filters.append(f"year >= {start.year}")
+        filters.append(f"datetime_utc >= TIMESTAMPTZ {sql_str(start.isoformat())}")
+    if end is not None:
+        filters.append(f"year <= {last_year}")
+        filters.append(f"datetime_utc < TIMESTAMPTZ {sql_str(end.isoformat())}")
+    scan = (f"SELECT * FROM read_parquet({sql_str(level_dir / '*' / '*' / '*.parquet')},"
+            f" hive_partitioning = true, union_by_name = true, filename = true)")
+    if filters:
+        scan += " WHERE " + " AND ".join(filters)
+    if has_parts:
+        # 'part-*' sorts after 'data.parquet': not-yet-compacted rows win, like in compaction
+        scan += (f" QUALIFY row_number() OVER (PARTITION BY datetime_utc, {zone_col}"
+                 f" ORDER BY filename DESC) = 1")
+    rel = connection().sql(f"SELECT * EXCLUDE (filename) FROM ({scan})")
+
+    if columns is not None:
+        rel = rel.project(", ".join(sql_ident(c) for c in columns))
+    return rel
+
+def load(granularity: str, **kwargs) -> pd.DataFrame:
+    """open(...) materialized as a pandas DataFrame."""
+    return open(granularity, **kwargs).df()
@@ -0,0 +1,197 @@
+# consolidate.py
+"""
+Raw Electricity Maps CSV exports -> typed, hive-partitioned big_* datasets.
+
+Layout (same scheme as ingest.py's data/granularity=/zone=/year=):
+
+    datasets/big/frequency=<freq>/region=<zone id>/year=<year>/data.parquet
+
+Each raw region/year CSV (datasets/<FOLDER>/<region>_<year>_<freq>.csv) becomes
+exactly one partition file. The CSV is read in record batches with pyarrow, with
+types applied at read time (including the UTC timestamp). The rows are renamed,
+sorted by datetime_utc and written in row groups sized per frequency, so their
+min/max statistics let DuckDB/pyarrow skip files and row groups on time-range
+filters. The partition keys live in the path only. The files are built in a
+process pool, one task per (region, frequency, year).
+
+The old datasets/<FOLDER>/cleaned/<freq>.csv copies are no longer an input.
+consolidate_all(write_cleaned=True) still writes them, as debug output.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from schema import ARROW_TYPES, EM_CSV_TARGETS, SchemaAdapter, read_csv_header
+
+
+# ---------- Config ----------
+BASE_DIR = Path("datasets")
+REGIONS = {                      # zone id -> folder under BASE_DIR
+    "US-FLA-FPL": "FL",
+    "US-CAL-CISO": "CA",
+    "US-NY-NYIS": "NY",
+}
+FREQUENCIES = ["hourly", "daily", "monthly", "yearly"]
+YEARS = [2021, 2022, 2023, 2024]
+BLOCK_SIZE = 1 << 20             # bytes of CSV text per record batch
+
+KINDS = {target: kind for target, kind, _ in EM_CSV_TARGETS}
+DATETIME_COL = "datetime_utc"
+PARTITIONING = [("frequency", pa.string()), ("region", pa.string()), ("year", pa.int64())]  # hive keys, path only
+ROW_GROUP_ROWS = {               # ~one month per row group for time-range pruning
+    "hourly": 24 * 31,
+    "daily": 31,
+    "monthly": 12,
+    "yearly": 1,
+}
+
+
+# ---------- Helpers ----------
+def raw_csv_path(base_dir: Path, region_id: str, folder: str, year: int, freq: str) -> Path:
+    return base_dir / folder / f"{region_id}_{year}_{freq}.csv"
+
+def renamed_header(path: Path) -> List[str]:
+    header = read_csv_header(path)
+    rename_map = SchemaAdapter.for_header(tuple(header), EM_CSV_TARGETS).rename_map
+    return [rename_map.get(c, c) for c in header]
+
+def column_type(name: str) -> pa.DataType:
+    # every column gets its declared type (schema.EM_CSV_TARGETS) so all batches share one schema
+    if name == DATETIME_COL:
+        return pa.timestamp("s", tz="UTC")
+    return ARROW_TYPES[KINDS.get(name, "str")]
+
+def read_type(name: str) -> pa.DataType:
+    # the exports carry no UTC offset: parse naive, enrich() casts to UTC
+    if name == DATETIME_COL:
+        return pa.timestamp("s")
+    return column_type(name)
+
+def output_schema(paths: Iterable[Path]) -> pa.Schema:
+    """Union of the renamed headers of all inputs (first-seen order), minus the partition keys."""
+    names: List[str] = []
+    for path in paths:
+        names += [c for c in renamed_header(path) if c not in names]
+    return pa.schema([pa.field(c, column_type(c)) for c in names if c not in dict(PARTITIONING)])
+
+def text_schema(schema: pa.Schema) -> pa.Schema:
+    """Same schema with categorical columns decoded, for the CSV debug output."""
+    return pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type)
+                      for f in schema])
+
+def iter_batches(path: Path) -> Iterable[pa.RecordBatch]:
+    names = renamed_header(path)
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(column_names=names, skip_rows=1, block_size=BLOCK_SIZE),
+        convert_options=pv.ConvertOptions(column_types={c: read_type(c) for c in names}),
+    )
+    yield from reader
+
+def enrich(batch: pa.RecordBatch, schema: pa.Schema, values: Dict[str, object]) -> pa.RecordBatch:
+    """Conform one batch to `schema`: fill in constant `values`, null-fill absent columns."""
+    n = batch.num_rows
+    arrays = []
+    for field in schema:
+        if field.name in values:
+            arrays.append(pa.array([values[field.name]] * n, field.type))
+        elif field.name in batch.schema.names:
+            arrays.append(batch.column(field.name).cast(field.type))
+        else:
+            arrays.append(pa.nulls(n, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def partition_path(output_dir: Path, freq: str, region_id: str, year: int) -> Path:
+    return output_dir / f"frequency={freq}" / f"region={region_id}" / f"year={year}" / "data.parquet"
+
+def build_partition(path: Path, schema: pa.Schema, out_path: Path, row_group_rows: int) -> int:
+    """Raw CSV -> one sorted partition file (runs in a worker process). Returns rows written."""
+    print(f"Reading: {path}")
+    table = pa.Table.from_batches([enrich(b, schema, {}) for b in iter_batches(path)], schema=schema)
+    table = table.sort_by(DATETIME_COL)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, out_path, row_group_size=row_group_rows)
+    return table.num_rows
+
+
+# ---------- Consolidation ----------
+Source = Tuple[str, str, int, Path]      # region id, folder, year, raw CSV path
+
+def find_sources(base_dir: Path, freq: str, regions: Dict[str, str], years: List[int]) -> List[Source]:
+    sources = []
+    for region_id, folder in regions.items():
+        for year in years:
+            path = raw_csv_path(base_dir, region_id, folder, year, freq)
+            if path.exists():
+                sources.append((region_id, folder, year, path))
+            else:
+                print(f"Missing: {path}")
+    return sources
+
+def write_cleaned_csv(base_dir: Path, output_dir: Path, freq: str, sources: List[Source], schema: pa.Schema):
+    """Debug output: <FOLDER>/cleaned/<freq>.csv rebuilt from the partitions, region/year order."""
+    full = pa.schema(list(schema) + [pa.field(c, t) for c, t in PARTITIONING])
+    text = text_schema(full)
+    writers: Dict[str, pv.CSVWriter] = {}
+    try:
+        for region_id, folder, year, _ in sources:
+            if folder not in writers:
+                cleaned_path = base_dir / folder / "cleaned" / f"{freq}.csv"
+                cleaned_path.parent.mkdir(exist_ok=True)
+                writers[folder] = pv.CSVWriter(cleaned_path, text)
+            values = {"frequency": freq, "region": region_id, "year": year}
+            for batch in pq.ParquetFile(partition_path(output_dir, freq, region_id, year)).iter_batches():
+                batch = enrich(batch, full, values)
+                writers[folder].write_table(pa.Table.from_batches([batch]).cast(text))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+def consolidate_all(base_dir: Path = BASE_DIR, regions: Dict[str, str] = REGIONS,
+                    frequencies: List[str] = FREQUENCIES, years: List[int] = YEARS,
+                    write_cleaned: bool = False, workers: Optional[int] = None):
+    """
+    Pipeline entry point: raw <region>_<year>_<freq>.csv ->
+    big/frequency=<freq>/region=<region>/year=<year>/data.parquet.
+
+    Partitions are built in a process pool of `workers` processes (default: one per
+    core). Every task writes its own file, so the result does not depend on which
+    task finishes first. workers=1 builds them in this process, one at a time.
+    """
+    output_dir = base_dir / "big"
+    tasks = []
+    plans = []
+    for freq in frequencies:
+        sources = find_sources(base_dir, freq, regions, years)
+        if not sources:
+            continue
+        schema = output_schema(path for *_, path in sources)
+        plans.append((freq, sources, schema))
+        tasks += [(path, schema, partition_path(output_dir, freq, region_id, year), ROW_GROUP_ROWS[freq])
+                  for region_id, _, year, path in sources]
+
+    if not tasks:
+        return
+    if workers == 1:
+        rows = [build_partition(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(build_partition, *zip(*tasks)))
+
+    done = iter(rows)
+    for freq, sources, schema in plans:
+        total = sum(next(done) for _ in sources)
+        print(f"Saved: {output_dir / f'frequency={freq}'} ({len(sources)} partitions, {total} rows)")
+        if write_cleaned:
+            write_cleaned_csv(base_dir, output_dir, freq, sources, schema)
+
+
+if __name__ == "__main__":
+    consolidate_all()
+    print("Done")
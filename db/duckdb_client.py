@@ -3,67 +3,259 @@ DuckDB Client for Remote Access
 
 A client library for interacting with a remote DuckDB database via REST API.
 Supports both read operations (queries) and write operations (execute).
+
+Query results are requested as an Arrow IPC stream (or Parquet) and decoded
+without a JSON round-trip, keeping column types such as timestamps. Servers that
+only speak JSON still work: the client falls back to the {"data": [...]} payload.
+
+Pass cache=QueryCache(...) (query_cache.py) to serve repeated reads locally.
+
+Given a local database file instead of a URL, the same interface runs on an
+in-process duckdb.connect(path) (local_backend.py).
 """
 
+import io
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Union
+
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from query_cache import ANY_TABLE, QueryCache, normalize_sql, referenced_tables
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # JSON transport only
+    pa = None
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+# Connection settings
+POOL_SIZE = 10                   # keep-alive connections kept per host
+TIMEOUT = (10, 600)              # (connect, read) seconds; CTAS loads can run for minutes
+RETRIES = 3                      # connection errors; 502/503/504 on GET only
+BACKOFF = 0.5
+BATCH_ROWS = 100_000             # rows per chunk yielded by iter_query
+UPLOAD_MODES = ("append", "replace")
 
 
 class DuckDBClient:
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: Optional[str] = None, pool_size: int = POOL_SIZE,
+                 timeout=TIMEOUT, retries: int = RETRIES, cache: Optional[QueryCache] = None):
         """
         Initialize client
 
         Args:
-            base_url: The public URL of the DuckDB server
-            token: Your API token
+            base_url: The public URL of the DuckDB server, or a local
+                      database file path (":memory:" for a scratch database)
+            token: Your API token (not needed for a local database)
+            pool_size: Keep-alive connections held open to the server
+            timeout: Seconds per request, a number or (connect, read)
+            retries: Retries on connection errors / 502-504 responses
+            cache: QueryCache for query/get_schema/get_info results (None: no caching)
         """
+        self.local = None
+        if not base_url.startswith(("http://", "https://")):
+            from local_backend import LocalBackend   # needs duckdb, remote mode does not
+            self.local = LocalBackend(base_url)
         self.base_url = base_url.rstrip('/')
-        self.headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.cache = cache
+        self.headers = {"Content-Type": "application/json"}
+        if token is not None:
+            self.headers["Authorization"] = f"Bearer {token}"
+        # One session for every call: TCP/TLS connections through the tunnel are reused.
+        # POSTs are only retried when the connection failed before the request was sent.
+        retry = Retry(total=retries, backoff_factor=BACKOFF, status_forcelist=(502, 503, 504),
+                      allowed_methods=frozenset({"GET"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._streams_arrow = pa is not None   # cleared once the server answers JSON
+
+    def close(self):
+        """Close the pooled connections (or the local database)."""
+        self.session.close()
+        if self.local is not None:
+            self.local.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get(self, path: str, **kwargs) -> requests.Response:
+        response = self.session.get(f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _post(self, path: str, **kwargs) -> requests.Response:
+        response = self.session.post(f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _cached(self, key: str, tables, fetch):
+        """fetch() through the cache, when one is configured."""
+        if self.cache is None:
+            return fetch()
+        value = self.cache.get(key)
+        if value is None:
+            value = fetch()
+            self.cache.put(key, value, tables)
+        return value
+
+    def _invalidate(self, statements: Iterable[str]):
+        """Drop cached results that read the tables these statements write to."""
+        if self.cache is None:
+            return
+        tables = set()
+        for sql in statements:
+            found = referenced_tables(sql)
+            if not found:           # target not recognized: play safe
+                self.cache.clear()
+                return
+            tables |= found
+        self.cache.invalidate(tables)
 
     def health_check(self) -> dict:
         """Check if server is healthy"""
-        response = requests.get(f"{self.base_url}/health")
-        response.raise_for_status()
-        return response.json()
+        if self.local is not None:
+            return self.local.health()
+        return self._get("/health").json()
 
     def list_tables(self) -> pd.DataFrame:
         """List all available tables"""
-        response = requests.get(
-            f"{self.base_url}/tables",
-            headers=self.headers
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = self.local.tables() if self.local is not None else self._get("/tables").json()
         return pd.DataFrame(data["tables"])
 
-    def query(self, sql: str) -> pd.DataFrame:
+    def query(self, sql: str, as_arrow: bool = False):
         """
         Execute a SELECT query (READ operation)
 
         Args:
             sql: SQL query string
+            as_arrow: Return a pyarrow Table instead of a DataFrame
 
         Returns:
-            pandas DataFrame
+            pandas DataFrame (or pyarrow Table)
         """
-        response = requests.post(
-            f"{self.base_url}/query",
-            json={"query": sql},
-            headers=self.headers
-        )
-        response.raise_for_status()
-        data = response.json()
+        if as_arrow and pa is None:
+            raise ImportError("as_arrow=True requires pyarrow")
+        return self._cached(f"query:{'arrow' if as_arrow else 'pandas'}:{normalize_sql(sql)}",
+                            referenced_tables(sql), lambda: self._fetch_query(sql, as_arrow))
 
-        if data['rows'] > 0:
+    def _fetch_query(self, sql: str, as_arrow: bool):
+        if self.local is not None:
+            table = self.local.query(sql)
+        else:
+            response = self._post("/query", json={"query": sql}, headers={"Accept": self._accept()})
+            table = self._decode_binary(response)
+
+        if table is None:
+            data = response.json()
+            if data['rows'] == 0:
+                print("Query executed successfully (0 rows)")
+                return pa.table({}) if as_arrow else pd.DataFrame()
             print(f"Query returned {data['rows']} rows")
-            return pd.DataFrame(data["data"])
+            df = pd.DataFrame(data["data"])
+            return pa.Table.from_pandas(df, preserve_index=False) if as_arrow else df
+
+        if table.num_rows > 0:
+            print(f"Query returned {table.num_rows} rows")
         else:
             print("Query executed successfully (0 rows)")
-            return pd.DataFrame()
+        return table if as_arrow else table.to_pandas()
+
+    @staticmethod
+    def _accept() -> str:
+        """Preferred result formats, binary first when pyarrow is available."""
+        if pa is None:
+            return "application/json"
+        return f"{ARROW_STREAM}, {PARQUET};q=0.9, application/json;q=0.5"
+
+    @staticmethod
+    def _decode_binary(response):
+        """Arrow IPC / Parquet response body -> pyarrow Table; None for JSON."""
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if pa is None or content_type not in (ARROW_STREAM, PARQUET):
+            return None
+        buffer = pa.py_buffer(response.content)  # wraps the body, no copy
+        if content_type == ARROW_STREAM:
+            return pa.ipc.open_stream(buffer).read_all()
+        return pq.read_table(pa.BufferReader(buffer))
+
+    def iter_query(self, sql: str, batch_rows: int = BATCH_ROWS, as_arrow: bool = False):
+        """
+        Run a SELECT query and yield the result in chunks of `batch_rows` rows.
+
+        When the server answers with an Arrow IPC stream, the record batches are
+        read off the socket as they arrive. Otherwise (JSON-only server, or no
+        pyarrow) the query is paged with LIMIT/OFFSET, one request per chunk.
+        Give the query an ORDER BY in that case so the pages are stable.
+
+        Args:
+            sql: SQL query string (without a trailing semicolon)
+            batch_rows: Rows per yielded chunk
+            as_arrow: Yield pyarrow RecordBatches instead of DataFrames
+
+        Yields:
+            pandas DataFrame (or pyarrow RecordBatch) per chunk
+        """
+        if as_arrow and pa is None:
+            raise ImportError("as_arrow=True requires pyarrow")
+        if self.local is not None:
+            chunks = self.local.stream(sql, batch_rows)
+        else:
+            chunks = self._iter_stream(sql, batch_rows) if self._streams_arrow else None
+        if chunks is None:
+            chunks = self._iter_pages(sql, batch_rows)
+
+        total = 0
+        for chunk in chunks:
+            if as_arrow and isinstance(chunk, pd.DataFrame):
+                chunk = pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+            elif not as_arrow and not isinstance(chunk, pd.DataFrame):
+                chunk = chunk.to_pandas()
+            total += len(chunk)
+            yield chunk
+        print(f"Query streamed {total} rows")
+
+    def _iter_stream(self, sql: str, batch_rows: int):
+        """Re-chunked record batches of an Arrow IPC response; None when the server answers JSON."""
+        response = self._post("/query", json={"query": sql}, headers={"Accept": ARROW_STREAM},
+                              stream=True)
+        if response.headers.get("Content-Type", "").split(";")[0].strip() != ARROW_STREAM:
+            response.close()     # body left unread: the full JSON result never reaches this process
+            self._streams_arrow = False
+            return None
+
+        def batches() -> Iterator["pa.RecordBatch"]:
+            with response:
+                response.raw.decode_content = True
+                yield from _rechunk(pa.ipc.open_stream(response.raw), batch_rows)
+        return batches()
+
+    def _iter_pages(self, sql: str, batch_rows: int) -> Iterator[pd.DataFrame]:
+        offset = 0
+        while True:
+            page = f"SELECT * FROM ({sql}) AS page LIMIT {batch_rows} OFFSET {offset}"
+            response = self._post("/query", json={"query": page}, headers={"Accept": "application/json"})
+            df = pd.DataFrame(response.json()["data"])
+            if len(df):
+                yield df
+            if len(df) < batch_rows:
+                return
+            offset += batch_rows
 
     def execute(self, sql: str) -> dict:
         """
@@ -75,13 +267,120 @@ class DuckDBClient:
         Returns:
             dict with execution result
         """
-        response = requests.post(
-            f"{self.base_url}/execute",
-            json={"query": sql},
-            headers=self.headers
-        )
-        response.raise_for_status()
-        result = response.json()
+        try:
+            result = self._run(sql)
+        finally:
+            self._invalidate([sql])
+        print(f"✓ {result['message']}")
+        return result
+
+    def execute_many(self, statements: Iterable[str], transaction: bool = True) -> dict:
+        """
+        Execute a batch of write statements in one request
+
+        The statements are sent as one script. With transaction=True it is wrapped
+        in BEGIN TRANSACTION / COMMIT, so either every statement is applied or none
+        is; on failure a ROLLBACK is sent before the error is raised.
+
+        Args:
+            statements: SQL statements (trailing semicolons optional)
+            transaction: Run the batch atomically
+
+        Returns:
+            dict with execution result
+        """
+        statements = [s.strip().rstrip(";") for s in statements if s.strip()]
+        if not statements:
+            return {"message": "No statements"}
+        script = ["BEGIN TRANSACTION", *statements, "COMMIT"] if transaction else statements
+        try:
+            # separators on their own line: a trailing "-- comment" would swallow them
+            result = self._run("\n;\n".join(script) + "\n;")
+        except Exception:
+            if transaction:
+                self._rollback()
+            raise
+        finally:
+            self._invalidate(statements)
+        print(f"✓ {result['message']} ({len(statements)} statements)")
+        return result
+
+    def _run(self, sql: str) -> dict:
+        if self.local is not None:
+            return self.local.execute(sql)
+        return self._post("/execute", json={"query": sql}).json()
+
+    def _rollback(self):
+        try:
+            self._run("ROLLBACK")
+        except Exception:
+            pass  # no transaction left open
+
+    @contextmanager
+    def transaction(self):
+        """
+        Collect statements and run them atomically on exit (nothing is sent if
+        the block raises):
+
+            with client.transaction() as tx:
+                tx.append("DROP TABLE IF EXISTS t")
+                tx.append("CREATE TABLE t AS SELECT ...")
+        """
+        batch: List[str] = []
+        yield batch
+        self.execute_many(batch, transaction=True)
+
+    def execute_concurrent(self, statements: Iterable[str], max_workers: Optional[int] = None) -> List[dict]:
+        """
+        Execute independent statements (e.g. CREATE TABLE AS loads) in parallel
+        over the pooled connections. Not atomic: each statement commits on its own.
+
+        Returns:
+            list of execution results, in input order
+        """
+        statements = list(statements)
+        with ThreadPoolExecutor(max_workers=max_workers or self.pool_size) as pool:
+            return list(pool.map(self.execute, statements))
+
+    def upload(self, data: Union[pd.DataFrame, "pa.Table", str, Path], table: str,
+               mode: str = "append") -> dict:
+        """
+        Bulk-load a DataFrame, Arrow table or local Parquet file into a table
+
+        The rows are sent as Parquet in the request body (POST /upload) and the
+        server inserts them natively -- no SQL literals. A Parquet file is
+        streamed from disk as is.
+
+        Args:
+            data: pandas DataFrame, pyarrow Table, or path to a .parquet file
+            table: Target table name
+            mode: "append" (created if missing) or "replace"
+
+        Returns:
+            dict with upload result
+        """
+        if mode not in UPLOAD_MODES:
+            raise ValueError(f"Unknown mode {mode!r}; expected one of {UPLOAD_MODES}.")
+        params = {"table": table, "mode": mode}
+        headers = {"Content-Type": PARQUET}
+
+        if self.local is not None:
+            result = self.local.upload(data, table, mode)
+        elif isinstance(data, (str, Path)):
+            with open(data, "rb") as f:
+                result = self._post("/upload", params=params, data=f, headers=headers).json()
+        else:
+            if pa is None:
+                raise ImportError("Uploading a DataFrame requires pyarrow")
+            if isinstance(data, pd.DataFrame):
+                data = pa.Table.from_pandas(data, preserve_index=False)
+            body = io.BytesIO()
+            pq.write_table(data, body)
+            body.seek(0)
+            result = self._post("/upload", params=params, data=body, headers=headers).json()
+
+        if self.cache is not None:
+            self.cache.invalidate([table.lower()])
         print(f"✓ {result['message']}")
         return result
 
@@ -95,12 +394,9 @@ class DuckDBClient:
         Returns:
             pandas DataFrame with schema information
         """
-        response = requests.get(
-            f"{self.base_url}/schema/{table_name}",
-            headers=self.headers
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = self._cached(f"schema:{table_name.lower()}", [table_name.lower()],
+                            lambda: self.local.schema(table_name) if self.local is not None
+                            else self._get(f"/schema/{table_name}").json())
 
         print(f"Table: {data['table']}")
         print(f"Rows: {data['row_count']:,}")
@@ -114,9 +410,28 @@ class DuckDBClient:
         Returns:
             dict with database info including table count and table list
         """
-        response = requests.get(
-            f"{self.base_url}/info",
-            headers=self.headers
-        )
-        response.raise_for_status()
-        return response.json()
+        return self._cached("info", [ANY_TABLE], lambda: self.local.info() if self.local is not None
+                            else self._get("/info").json())
+
+
+def _rechunk(batches, batch_rows: int):
+    """Regroup a stream of record batches into batches of exactly `batch_rows` rows (last one shorter)."""
+    pending: List["pa.RecordBatch"] = []
+    size = 0
+    for batch in batches:
+        while batch.num_rows:
+            take = min(batch_rows - size, batch.num_rows)
+            pending.append(batch.slice(0, take))
+            size += take
+            batch = batch.slice(take)
+            if size == batch_rows:
+                yield _combine(pending)
+                pending, size = [], 0
+    if size:
+        yield _combine(pending)
+
+
+def _combine(batches: List["pa.RecordBatch"]) -> "pa.RecordBatch":
+    if len(batches) == 1:
+        return batches[0]
+    return pa.Table.from_batches(batches).combine_chunks().to_batches()[0]
@@ -14,120 +14,59 @@ API_TOKEN = "token-vGG2vbS8IyEVYct5g6jFqQ"
 client = DuckDBClient(base_url=BASE_URL, token=API_TOKEN)
 print("Starting Complete Data Load to Remote DuckDB...")
 
+# Loads are independent of each other. False: DROPs and CREATEs go out as one
+# transactional batch (one round-trip, all or nothing). True: the DROPs are one
+# transaction, then the CREATEs run in parallel, each committing on its own.
+CONCURRENT_LOADS = False
+
 # ========================================
-# 1. CLEANUP (DROP)
-# Drop all existing data tables to ensure a clean slate before recreation.
+# 1. TABLES TO (RE)CREATE
+# table name -> SELECT used for CREATE TABLE AS
 # ========================================
 
-print("\n█ 1. Cleanup (DROP) Existing Tables █")
-tables_to_drop = [
-    # Parquet Data (Weather/Time-Series - Assuming cal_*.parquet and fl_*.parquet exist)
-    "CAL_DAILY_DATA",
-    "FL_DAILY_DATA",
-    # CSV Data (Energy/Infrastructure)
-    "REVENUE_EXPENSE_STATS",
-    "FUEL_CONSUMPTION_ANNUAL",
-    "FUEL_CONSUMPTION_MONTHLY",
-    "GENERATING_UNITS_NEW",
-    "NET_GENERATION_US",
-    "GLOBAL_CONSUMPTION",
-    "SUMMARY_CUSTOMER_STATS",
-    "SALES_BY_PROVIDER",
-    "SALES_BY_STATE_YTD"
-]
-
-for table_name in tables_to_drop:
-    # Sends a DROP TABLE command to the remote server
-    client.execute(f"DROP TABLE IF EXISTS {table_name}")
+LOADS = {
+    ### A) HOURLY/DAILY DATA (PARQUET FILES)
+    # California (CAL) - Uses Globbing to load all 'cal_*.parquet' files (e.g., 2021, 2022_2023)
+    "CAL_DAILY_DATA": "SELECT * FROM read_parquet('cal_*.parquet')",
+    # Florida (FL) - Uses Globbing to load all 'fl_*.parquet' files
+    "FL_DAILY_DATA": "SELECT * FROM read_parquet('fl_*.parquet')",
+
+    ### B) ENERGY AND INFRASTRUCTURE DATA (CSV FILES)
+    # Revenue and Expense Financial Data
+    "REVENUE_EXPENSE_STATS": "SELECT * FROM read_csv_auto('revenue_expense.xlsx - epa_08_03.csv')",
+    # Annual Fuel Consumption
+    "FUEL_CONSUMPTION_ANNUAL": "SELECT * FROM read_csv_auto('Table_7.3a_Consumption_of_Combustible_Fuels_for_Electricity_Generation__Total_(All_Sectors).xlsx - Annual Data.csv')",
+    # Monthly Fuel Consumption
+    "FUEL_CONSUMPTION_MONTHLY": "SELECT * FROM read_csv_auto('Table_7.3a_Consumption_of_Combustible_Fuels_for_Electricity_Generation__Total_(All_Sectors).xlsx - Monthly Data.csv')",
+    # New Generating Units by Company (Infrastructure Growth)
+    "GENERATING_UNITS_NEW": "SELECT * FROM read_csv_auto('Generating Units by Operating Company.xlsx - Table_6_03.csv')",
+    # US Net Generation by Source
+    "NET_GENERATION_US": "SELECT * FROM read_csv_auto('Net_generation_for_all_sectors.csv')",
+    # Global Net Consumption
+    "GLOBAL_CONSUMPTION": "SELECT * FROM read_csv_auto('world_net_consumption.csv')",
+    # Summary Customer Statistics (Number of Customers)
+    "SUMMARY_CUSTOMER_STATS": "SELECT * FROM read_csv_auto('summary_2014_2024.xlsx - epa_01_02.csv')",
+    # Sales by Sector and Provider
+    "SALES_BY_PROVIDER": "SELECT * FROM read_csv_auto('by_sector_by_provider.xlsx - epa_02_02.csv')",
+    # Year-to-Date Sales by Sector and State
+    "SALES_BY_STATE_YTD": "SELECT * FROM read_csv_auto('by_sector_by_state.xlsx - Table_5_04_B.csv')",
+}
+
+drops = [f"DROP TABLE IF EXISTS {table_name}" for table_name in LOADS]
+creates = [f"CREATE TABLE {table_name} AS {select}" for table_name, select in LOADS.items()]
 
 # ========================================
-# 2. CREATE AND LOAD DATA (CREATE TABLE AS SELECT)
+# 2. DROP AND CREATE
 # ========================================
 
-print("\n█ 2. Creating (CREATE) and Loading Data █")
-
-### A) HOURLY/DAILY DATA (PARQUET FILES)
-print("Loading Daily/Time-Series Data (Parquet)...")
-
-# 2.1 California (CAL) - Uses Globbing to load all 'cal_*.parquet' files (e.g., 2021, 2022_2023)
-client.execute("""
-    CREATE TABLE CAL_DAILY_DATA AS
-    SELECT *
-    FROM read_parquet('cal_*.parquet')
-""")
-
-# 2.2 Florida (FL) - Uses Globbing to load all 'fl_*.parquet' files
-client.execute("""
-    CREATE TABLE FL_DAILY_DATA AS
-    SELECT *
-    FROM read_parquet('fl_*.parquet')
-""")
-
-### B) ENERGY AND INFRASTRUCTURE DATA (CSV FILES)
-print("Loading Energy and Infrastructure Data (CSV)...")
-
-# 2.3 Revenue and Expense Financial Data
-client.execute("""
-    CREATE TABLE REVENUE_EXPENSE_STATS AS
-    SELECT *
-    FROM read_csv_auto('revenue_expense.xlsx - epa_08_03.csv')
-""")
-
-# 2.4 Annual Fuel Consumption
-client.execute("""
-    CREATE TABLE FUEL_CONSUMPTION_ANNUAL AS
-    SELECT *
-    FROM read_csv_auto('Table_7.3a_Consumption_of_Combustible_Fuels_for_Electricity_Generation__Total_(All_Sectors).xlsx - Annual Data.csv')
-""")
-
-# 2.5 Monthly Fuel Consumption
-client.execute("""
-    CREATE TABLE FUEL_CONSUMPTION_MONTHLY AS
-    SELECT *
-    FROM read_csv_auto('Table_7.3a_Consumption_of_Combustible_Fuels_for_Electricity_Generation__Total_(All_Sectors).xlsx - Monthly Data.csv')
-""")
-
-# 2.6 New Generating Units by Company (Infrastructure Growth)
-client.execute("""
-    CREATE TABLE GENERATING_UNITS_NEW AS
-    SELECT *
-    FROM read_csv_auto('Generating Units by Operating Company.xlsx - Table_6_03.csv')
-""")
-
-# 2.7 US Net Generation by Source
-client.execute("""
-    CREATE TABLE NET_GENERATION_US AS
-    SELECT *
-    FROM read_csv_auto('Net_generation_for_all_sectors.csv')
-""")
-
-# 2.8 Global Net Consumption
-client.execute("""
-    CREATE TABLE GLOBAL_CONSUMPTION AS
-    SELECT *
-    FROM read_csv_auto('world_net_consumption.csv')
-""")
-
-# 2.9 Summary Customer Statistics (Number of Customers)
-client.execute("""
-    CREATE TABLE SUMMARY_CUSTOMER_STATS AS
-    SELECT *
-    FROM read_csv_auto('summary_2014_2024.xlsx - epa_01_02.csv')
-""")
-
-# 2.10 Sales by Sector and Provider
-client.execute("""
-    CREATE TABLE SALES_BY_PROVIDER AS
-    SELECT *
-    FROM read_csv_auto('by_sector_by_provider.xlsx - epa_02_02.csv')
-""")
-
-# 2.11 Year-to-Date Sales by Sector and State
-client.execute("""
-    CREATE TABLE SALES_BY_STATE_YTD AS
-    SELECT *
-    FROM read_csv_auto('by_sector_by_state.xlsx - Table_5_04_B.csv')
-""")
+if CONCURRENT_LOADS:
+    print("\n█ 1. Cleanup (DROP) Existing Tables █")
+    client.execute_many(drops)
+    print("\n█ 2. Creating (CREATE) and Loading Data (concurrent) █")
+    client.execute_concurrent(creates)
+else:
+    print("\n█ 1-2. Cleanup (DROP) and Load (CREATE) in one transaction █")
+    client.execute_many(drops + creates)
 
 
 # ========================================
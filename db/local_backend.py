@@ -0,0 +1,102 @@
+"""
+In-process DuckDB backend for DuckDBClient
+
+DuckDBClient("path/to/file.duckdb") runs everything through duckdb.connect(path)
+instead of the REST server: no tunnel, no serialization, results come back as
+Arrow. Every method returns what the matching server endpoint returns, so the
+client code above it is the same for both modes.
+"""
+
+import threading
+from pathlib import Path
+from typing import Iterator, Union
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class LocalBackend:
+    def __init__(self, database: str, read_only: bool = False):
+        """
+        Args:
+            database: DuckDB database file (created if missing), or ":memory:"
+            read_only: Open the file read-only (lets several processes share it)
+        """
+        self.database = database
+        self._con = duckdb.connect(database, read_only=read_only)
+        self._local = threading.local()
+
+    @property
+    def con(self) -> duckdb.DuckDBPyConnection:
+        # one cursor per thread: DuckDB connections are not safe to share between threads,
+        # and a transaction has to stay on the cursor that opened it
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._con.cursor()
+        return cursor
+
+    def close(self):
+        self._con.close()
+
+    # ---- reads ----
+    def health(self) -> dict:
+        self.con.execute("SELECT 1").fetchone()
+        return {"status": "healthy", "database": self.database}
+
+    def tables(self) -> dict:
+        rows = self.con.execute("""
+            SELECT table_name, table_type FROM information_schema.tables
+            WHERE table_schema = 'main' ORDER BY table_name
+        """).fetchall()
+        return {"tables": [{"table": name, "type": kind} for name, kind in rows]}
+
+    def query(self, sql: str) -> pa.Table:
+        return self.con.execute(sql).fetch_arrow_table()
+
+    def stream(self, sql: str, batch_rows: int) -> Iterator[pa.RecordBatch]:
+        yield from self.con.execute(sql).fetch_record_batch(batch_rows)
+
+    def schema(self, table: str) -> dict:
+        described = self.con.execute(f"DESCRIBE {_ident(table)}").df()
+        row_count = self.con.execute(f"SELECT count(*) FROM {_ident(table)}").fetchone()[0]
+        return {"table": table, "row_count": row_count, "schema": described.to_dict("records")}
+
+    def info(self) -> dict:
+        names = [t["table"] for t in self.tables()["tables"]]
+        tables = [{"table": name, "rows": self.con.execute(f"SELECT count(*) FROM {_ident(name)}").fetchone()[0]}
+                  for name in names]
+        return {"database": self.database, "table_count": len(tables), "tables": tables}
+
+    # ---- writes ----
+    def execute(self, sql: str) -> dict:
+        self.con.execute(sql)
+        return {"message": "Statement executed successfully"}
+
+    def upload(self, data: Union[pd.DataFrame, pa.Table, str, Path], table: str, mode: str) -> dict:
+        con = self.con
+        if isinstance(data, (str, Path)):
+            source = f"read_parquet({_literal(Path(data).as_posix())})"
+        else:
+            con.register("_upload", data)
+            source = "_upload"
+        target = _ident(table)
+        try:
+            if mode == "replace":
+                con.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM {source}")
+            else:
+                con.execute(f"CREATE TABLE IF NOT EXISTS {target} AS SELECT * FROM {source} LIMIT 0")
+                con.execute(f"INSERT INTO {target} BY NAME SELECT * FROM {source}")
+            rows = con.execute(f"SELECT count(*) FROM {source}").fetchone()[0]
+        finally:
+            if source == "_upload":
+                con.unregister("_upload")
+        return {"message": f"Uploaded {rows:,} rows into {table} ({mode})", "rows": rows}
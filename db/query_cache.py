@@ -0,0 +1,249 @@
+"""
+Client-side result cache for DuckDBClient
+
+Opt-in: pass a QueryCache to DuckDBClient(cache=...). Read results (query,
+get_schema, get_info) are stored under their normalized SQL, so repeated
+dashboard loads skip the network. Entries expire after a TTL, the memory tier
+is LRU with an entry cap, and an optional disk tier (one pickle per entry) is
+capped in bytes and survives restarts.
+
+Writes through the same client (execute, execute_many, upload) drop every
+entry that references a table they touch. Changes made by other clients, or to
+the base tables of a view, are only picked up when the TTL runs out.
+"""
+
+import copy
+import hashlib
+import json
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable, Optional, Set
+
+ANY_TABLE = "*"                  # entry depends on every table (e.g. get_info)
+
+_STRING_OR_WORD = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\s+|[^\s'\"]+")
+_NAME = r"(?:\"(?:[^\"]|\"\")*\"|[a-z_][\w$]*)(?:\.(?:\"(?:[^\"]|\"\")*\"|[a-z_][\w$]*))*"
+_TABLE_REF = re.compile(
+    r"\b(?:from|join|into|update|truncate|copy|(?:table|view)(?:\s+if(?:\s+not)?\s+exists)?)\s+"
+    rf"({_NAME})(?![\w$.]|\s*\()",
+    re.IGNORECASE,
+)
+_FROM = re.compile(r"\bfrom\b", re.IGNORECASE)
+_LIST_ITEM = re.compile(rf"\s*(?:({_NAME})(?![\w$.]|\s*\()|[a-z_][\w$.]*\s*\(|\()", re.IGNORECASE)
+_CLAUSE_END = re.compile(
+    r"\b(?:where|group|order|limit|offset|having|window|qualify|union|except|intersect|returning)\b|[);]",
+    re.IGNORECASE,
+)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and case outside string literals / quoted names; drop a trailing ';'."""
+    parts = []
+    for token in _STRING_OR_WORD.findall(sql.strip().rstrip(";")):
+        if token[0] in "'\"":
+            parts.append(token)
+        elif token.isspace():
+            parts.append(" ")
+        else:
+            parts.append(token.lower())
+    return "".join(parts).strip()
+
+
+def referenced_tables(sql: str) -> Set[str]:
+    """
+    Table/view names after FROM, JOIN, INTO, UPDATE, TABLE, VIEW, ... and in the
+    rest of a comma-separated FROM list (table functions excluded). A FROM list
+    entry that can't be read as a name adds ANY_TABLE instead.
+    """
+    sql = _STRING.sub("''", sql)        # commas and keywords inside literals are not SQL
+    names = _TABLE_REF.findall(sql)
+    for match in _FROM.finditer(sql):
+        for item in _from_list(sql, match.end())[1:]:   # the first entry is _TABLE_REF's
+            parsed = _LIST_ITEM.match(item)
+            if parsed is None:
+                return _to_tables(names) | {ANY_TABLE}
+            if parsed.group(1):
+                names.append(parsed.group(1))
+    return _to_tables(names)
+
+
+def _to_tables(names: Iterable[str]) -> Set[str]:
+    tables = set()
+    for name in names:
+        last = name.rsplit(".", 1)[-1]  # schema-qualified names match on the table part
+        # DuckDB resolves names case-insensitively, quoted or not
+        tables.add((last[1:-1].replace('""', '"') if last.startswith('"') else last).lower())
+    return tables
+
+
+def _from_list(sql: str, pos: int) -> list:
+    """Entries of the FROM list starting at `pos`, split on top-level commas."""
+    items, start, depth, i = [], pos, 0, pos
+    while i < len(sql):
+        ch = sql[i]
+        if ch == '"':                   # quoted name: skip to its closing quote
+            i = sql.find('"', i + 1)
+            while 0 <= i < len(sql) - 1 and sql[i + 1] == '"':
+                i = sql.find('"', i + 2)
+            if i < 0:
+                i = len(sql)
+                break
+        elif ch == "(":
+            depth += 1
+        elif depth and ch == ")":
+            depth -= 1
+        elif not depth and ch == ",":
+            items.append(sql[start:i])
+            start = i + 1
+        elif not depth and _CLAUSE_END.match(sql, i):
+            break
+        i += 1
+    items.append(sql[start:i])
+    return items
+
+
+class QueryCache:
+    def __init__(self, ttl: float = 300, max_entries: int = 128,
+                 disk_dir: Optional[Path] = None, max_disk_bytes: int = 512 * 2**20):
+        """
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Entries kept in memory (least recently used evicted first)
+            disk_dir: Directory of the disk tier, None for memory only
+            max_disk_bytes: Size cap of the disk tier
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()   # key -> (expires, tables, value)
+        self._lock = threading.Lock()
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    # ---- lookup ----
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value for `key`, or None when missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return _copy(entry[2])
+                del self._memory[key]
+
+            entry = self._disk_get(key, now)
+            if entry is None:
+                return None
+            self._remember(key, entry)
+            return _copy(entry[2])
+
+    def put(self, key: str, value: Any, tables: Iterable[str]):
+        entry = (time.time() + self.ttl, frozenset(tables), _copy(value))
+        with self._lock:
+            self._remember(key, entry)
+            self._disk_put(key, entry)
+
+    # ---- invalidation ----
+    def invalidate(self, tables: Optional[Iterable[str]] = None):
+        """Drop entries that reference any of `tables` (or depend on all tables). None clears everything."""
+        tables = None if tables is None else set(tables)
+        with self._lock:
+            for key, (_, deps, _) in list(self._memory.items()):
+                if _hit(deps, tables):
+                    del self._memory[key]
+            for meta_path in self._disk_entries():
+                try:
+                    deps = frozenset(json.loads(meta_path.read_text())["tables"])
+                except (OSError, ValueError, KeyError):
+                    deps = frozenset([ANY_TABLE])
+                if _hit(deps, tables):
+                    self._disk_remove(meta_path)
+
+    def clear(self):
+        self.invalidate(None)
+
+    # ---- memory tier ----
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ---- disk tier: <hash>.pkl holds the entry, <hash>.json its expiry and tables ----
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / hashlib.sha256(key.encode()).hexdigest()
+
+    def _disk_entries(self):
+        return list(self.disk_dir.glob("*.json")) if self.disk_dir is not None else []
+
+    def _disk_get(self, key: str, now: float) -> Optional[tuple]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path.with_suffix(".pkl"), "rb") as f:
+                stored_key, entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if stored_key != key or entry[0] <= now:
+            self._disk_remove(path.with_suffix(".json"))
+            return None
+        path.with_suffix(".pkl").touch()     # recency for LRU eviction
+        return entry
+
+    def _disk_put(self, key: str, entry: tuple):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((key, entry), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path.with_suffix(".pkl"))
+        path.with_suffix(".json").write_text(json.dumps({"expires": entry[0], "tables": sorted(entry[1])}))
+        self._disk_evict()
+
+    def _disk_remove(self, meta_path: Path):
+        meta_path.with_suffix(".pkl").unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+
+    def _disk_evict(self):
+        """Remove expired entries, then the least recently used until under max_disk_bytes."""
+        now = time.time()
+        live = []
+        for meta_path in self._disk_entries():
+            data_path = meta_path.with_suffix(".pkl")
+            try:
+                expires = json.loads(meta_path.read_text())["expires"]
+                stat = data_path.stat()
+            except (OSError, ValueError, KeyError):
+                self._disk_remove(meta_path)
+                continue
+            if expires <= now:
+                self._disk_remove(meta_path)
+            else:
+                live.append((stat.st_mtime, stat.st_size, meta_path))
+
+        total = sum(size for _, size, _ in live)
+        for _, size, meta_path in sorted(live):
+            if total <= self.max_disk_bytes:
+                break
+            self._disk_remove(meta_path)
+            total -= size
+
+
+def _hit(deps: frozenset, tables: Optional[Set[str]]) -> bool:
+    return tables is None or ANY_TABLE in deps or ANY_TABLE in tables or bool(deps & tables)
+
+
+def _copy(value: Any) -> Any:
+    # DataFrames / dicts are mutable: callers get their own copy; Arrow tables are immutable
+    if hasattr(value, "copy") and not hasattr(value, "schema"):
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value.copy()
+    return value
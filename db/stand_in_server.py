@@ -0,0 +1,163 @@
+"""
+Local stand-in for the DuckDB REST server
+
+Serves the endpoints DuckDBClient talks to (/health, /tables, /query, /execute,
+/upload, /schema/<table>, /info) from an in-process DuckDB database, so the
+client's wire formats can be exercised without the tunnel:
+
+    python stand_in_server.py [database] [--port 8765] [--json-only]
+    python stand_in_server.py --check     # run the client against it and exit
+
+/query follows the client's Accept header (Arrow IPC stream, Parquet or JSON).
+--json-only answers JSON whatever is asked, like servers that predate the
+binary formats; /upload then returns 404 as well.
+"""
+
+import argparse
+import io
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from duckdb_client import ARROW_STREAM, PARQUET
+from local_backend import LocalBackend
+
+
+def make_server(database: str = ":memory:", port: int = 8765, json_only: bool = False) -> ThreadingHTTPServer:
+    backend = LocalBackend(database)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass  # keep the client's output readable
+
+        def _send(self, body: bytes, content_type: str, status: int = 200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, data, status: int = 200):
+            self._send(json.dumps(data, default=str).encode(), "application/json", status)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _handle(self, route):
+            try:
+                route()
+            except Exception as e:  # DuckDB errors -> 400, like the real server
+                self._json({"detail": str(e)}, 400)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/health":
+                self._handle(lambda: self._json(backend.health()))
+            elif path == "/tables":
+                self._handle(lambda: self._json(backend.tables()))
+            elif path == "/info":
+                self._handle(lambda: self._json(backend.info()))
+            elif path.startswith("/schema/"):
+                self._handle(lambda: self._json(backend.schema(path[len("/schema/"):])))
+            else:
+                self._json({"detail": "Not Found"}, 404)
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path == "/query":
+                self._handle(self._query)
+            elif url.path == "/execute":
+                self._handle(lambda: self._json(backend.execute(json.loads(self._body())["query"])))
+            elif url.path == "/upload" and not json_only:
+                self._handle(lambda: self._upload(parse_qs(url.query)))
+            else:
+                self._json({"detail": "Not Found"}, 404)
+
+        def _query(self):
+            table = backend.query(json.loads(self._body())["query"])
+            accept = self.headers.get("Accept", "")
+            if not json_only and ARROW_STREAM in accept:
+                sink = pa.BufferOutputStream()
+                with pa.ipc.new_stream(sink, table.schema) as writer:
+                    writer.write_table(table)
+                self._send(sink.getvalue().to_pybytes(), ARROW_STREAM)
+            elif not json_only and PARQUET in accept:
+                body = io.BytesIO()
+                pq.write_table(table, body)
+                self._send(body.getvalue(), PARQUET)
+            else:
+                records = table.to_pandas().to_dict("records")
+                self._json({"columns": table.column_names, "rows": len(records), "data": records})
+
+        def _upload(self, params):
+            data = pq.read_table(pa.BufferReader(self._body()))
+            self._json(backend.upload(data, params["table"][0], params.get("mode", ["append"])[0]))
+
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+def check():
+    """Run the client's read/write paths against a stand-in on a free port, both formats."""
+    from duckdb_client import DuckDBClient
+
+    for json_only in (False, True):
+        server = make_server(port=0, json_only=json_only)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"--- {'JSON-only' if json_only else 'Arrow'} server at {url}")
+        with DuckDBClient(url) as client:
+            client.execute_many([
+                "CREATE TABLE t (id INTEGER, ts TIMESTAMP, v DOUBLE)",
+                "INSERT INTO t SELECT i, TIMESTAMP '2024-01-01' + i * INTERVAL 1 HOUR, i / 2 FROM range(10) r(i)",
+            ])
+            df = client.query("SELECT * FROM t ORDER BY id")
+            assert len(df) == 10 and list(df.columns) == ["id", "ts", "v"]
+            if not json_only:   # JSON turns timestamps into strings
+                assert pd.api.types.is_datetime64_any_dtype(df["ts"])
+            assert sum(len(c) for c in client.iter_query("SELECT * FROM t ORDER BY id", batch_rows=3)) == 10
+
+            if json_only:
+                try:
+                    client.upload(df, "t")
+                except requests.HTTPError as e:
+                    print(f"upload without /upload: {e}")
+                else:
+                    raise AssertionError("upload should fail without /upload")
+            else:
+                client.upload(df, "t")
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = Path(tmp) / "rows.parquet"
+                    df.to_parquet(path, index=False)
+                    client.upload(path, "u", mode="replace")
+                assert client.query("SELECT count(*) AS n FROM t")["n"][0] == 20
+                assert client.query("SELECT count(*) AS n FROM u")["n"][0] == 10
+        server.shutdown()
+        server.server_close()
+    print("Stand-in check passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("database", nargs="?", default=":memory:")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json-only", action="store_true")
+    parser.add_argument("--check", action="store_true", help="self-check the client and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        check()
+    else:
+        server = make_server(args.database, args.port, args.json_only)
+        print(f"Serving {args.database} on http://127.0.0.1:{args.port} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
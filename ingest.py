@@ -1,7 +1,10 @@
 # ingest.py
 from __future__ import annotations
+import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 
@@ -10,6 +13,11 @@ load_dotenv()  # load .env before reading token
 
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+
+import partitions
+from rate_limit import get_limiter
+from schema import SchemaAdapter
 
 
 # ---------- Config ----------
@@ -18,6 +26,13 @@ REQUEST_TIMEOUT = 40
 RETRY_MAX = 4
 RETRY_SLEEP = 2                  # seconds (exponential backoff)
 CHUNK_DAYS = 10                  # API limit window for hourly data
+MAX_IN_FLIGHT = 8                # concurrent API requests during backfills
+RATE_PER_SECOND = 5              # token-bucket refill rate per API key
+RATE_BURST = 10                  # token-bucket capacity
+DAILY_QUOTA = None               # requests per UTC day (None = no daily cap)
+MANIFEST_NAME = "_manifest.json" # ledger of fetched windows, under BASE_DIR
+STALE_AFTER = pd.Timedelta(days=3)  # windows fetched sooner than this after their end get refetched
+ROW_KEY = ["datetime_utc", "zone"]  # de-duplication key of every granularity
 
 
 # ---------- Helpers ----------
@@ -27,81 +42,59 @@ def get_api_token() -> str:
         raise RuntimeError("Missing EM_API_TOKEN environment variable.")
     return token
 
+_session: Optional[requests.Session] = None
+_session_pool = 0
+_session_lock = threading.Lock()
+
+def get_session(pool_size: int = MAX_IN_FLIGHT) -> requests.Session:
+    """
+    Shared keep-alive session for all API calls. The connection pool holds at
+    least `pool_size` connections (pass the number of concurrent workers), so
+    workers reuse connections instead of blocking or discarding them.
+    """
+    global _session, _session_pool
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        if pool_size > _session_pool:
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            _session_pool = pool_size
+    return _session
+
+def to_iso(ts: pd.Timestamp) -> str:
+    return ts.isoformat().replace("+00:00", "Z")
+
 def month_window(year: int, month: int) -> tuple[pd.Timestamp, pd.Timestamp]:
     start = pd.Timestamp(year=year, month=month, day=1, tz="UTC")
     end = (start + pd.offsets.MonthEnd(1)).normalize() + pd.Timedelta(days=1)
     return start, end
 
-def ensure_datetime(s: pd.Series) -> pd.Series:
-    return pd.to_datetime(s, utc=True, errors="coerce")
+def month_windows(year: int, month: int) -> List[tuple[str, str]]:
+    """Split a month into CHUNK_DAYS windows as (start_iso, end_iso), end exclusive."""
+    start, month_end_exclusive = month_window(year, month)
+    windows = []
+    cur = start
+    while cur < month_end_exclusive:
+        nxt = min(cur + pd.Timedelta(days=CHUNK_DAYS), month_end_exclusive)
+        windows.append((to_iso(cur), to_iso(nxt)))
+        cur = nxt
+    return windows
 
 def standardize_columns(df: pd.DataFrame, zone: str) -> pd.DataFrame:
     """
     Normalize columns and types to a common schema:
     datetime_utc | zone | carbon_direct | carbon_lifecycle | cfe_pct | re_pct | estimated | estimation_method
+    The column plan is resolved once per header signature (see schema.SchemaAdapter).
     """
-    df = df.copy()
-
-    # normalize headers
-    df.columns = (df.columns
-                  .str.strip()
-                  .str.lower()
-                  .str.replace(" ", "_")
-                  .str.replace(r"[()]", "", regex=True))
-
-    # detect datetime-ish column
-    candidates_datetime = [c for c in df.columns if c in (
-        "datetime", "datetime_utc", "time", "timestamp", "utc_datetime", "datetime_(utc)", "date"
-    )]
-    if not candidates_datetime:
-        candidates_datetime = [c for c in df.columns if "date" in c or "time" in c]
-    if not candidates_datetime:
-        raise ValueError("No datetime-like column found in API response.")
-    dt_col = candidates_datetime[0]
-
-    # map possible source columns to our target schema
-    map_candidates = {
-        "carbon_direct": ["carbon_intensity", "carbon_intensity_gco2eq/kwh",
-                          "carbon_intensity_gco₂eq/kwh_(direct)", "carbonintensity", "direct"],
-        "carbon_lifecycle": ["lifecycle", "carbon_intensity_gco2eq/kwh_(life_cycle)",
-                             "life_cycle", "lifecycle_intensity"],
-        "cfe_pct": ["cfe", "cfe_%", "carbon-free_energy_percentage",
-                    "carbon-free_energy_percentage_(cfe%)"],
-        "re_pct": ["re", "re_%", "renewable_energy_percentage",
-                   "renewable_energy_percentage_(re%)"],
-        "estimated": ["estimated", "data_estimated"],
-        "estimation_method": ["estimation_method", "data_estimation_method", "estimation"]
-    }
-
-    out = pd.DataFrame({
-        "datetime_utc": ensure_datetime(df[dt_col]),
-        "zone": zone
-    })
-
-    def first_present(cols: List[str]) -> Optional[str]:
-        for c in cols:
-            if c in df.columns:
-                return c
-        return None
-
-    for target, cand_list in map_candidates.items():
-        c = first_present([x.lower() for x in cand_list])
-        out[target] = df[c] if c is not None else pd.NA
-
-    # numeric coercions
-    for col in ["carbon_direct", "carbon_lifecycle", "cfe_pct", "re_pct"]:
-        out[col] = pd.to_numeric(out[col], errors="coerce")
-
-    # boolean-ish for estimated
-    if out["estimated"].dtype == object:
-        out["estimated"] = out["estimated"].astype(str).str.lower().isin(["1", "true", "yes", "sim", "y"])
-
-    out = out.dropna(subset=["datetime_utc"]).sort_values("datetime_utc").reset_index(drop=True)
-    return out
+    return SchemaAdapter.for_header(tuple(df.columns)).apply(df, zone)
 
 def upsert_parquet(df: pd.DataFrame, base_dir: Path, granularity: str):
     """
-    Partitioned write by zone/year. If file exists, append and de-duplicate on (datetime_utc, zone).
+    Partitioned write by zone/year. Each call adds a part file named after the
+    rows' time span (part-<first>_<last>.parquet) next to data.parquet instead of
+    rewriting it, so the cost does not grow with the partition. Writing the same
+    span again replaces its part. Once a partition holds partitions.COMPACT_AFTER
+    parts it is compacted, which de-duplicates on (datetime_utc, zone).
     """
     if df.empty:
         return
@@ -109,50 +102,182 @@ def upsert_parquet(df: pd.DataFrame, base_dir: Path, granularity: str):
     df["year"] = df["datetime_utc"].dt.year
 
     for (zone, year), part in df.groupby(["zone", "year"]):
-        out = base_dir / f"granularity={granularity}/zone={zone}/year={year}/data.parquet"
-        out.parent.mkdir(parents=True, exist_ok=True)
-        if out.exists():
-            old = pd.read_parquet(out)
-            merged = (pd.concat([old, part], ignore_index=True)
-                      .drop_duplicates(subset=["datetime_utc", "zone"])
-                      .sort_values("datetime_utc"))
-        else:
-            merged = part.sort_values("datetime_utc")
-        merged.to_parquet(out, index=False)
+        part_dir = base_dir / f"granularity={granularity}/zone={zone}/year={year}"
+        first, last = part["datetime_utc"].min(), part["datetime_utc"].max()
+        partitions.write_part(part_dir, part, f"{first:%Y%m%dT%H}_{last:%Y%m%dT%H}", ROW_KEY)
+
+def compact_partition(part_dir: Path):
+    """Merge one zone/year partition into data.parquet, de-duplicated on (datetime_utc, zone)."""
+    partitions.compact_partition(part_dir, ROW_KEY)
+
+def compact_partitions(base_dir: Path, granularity: str):
+    for part_dir in sorted(base_dir.glob(f"granularity={granularity}/zone=*/year=*")):
+        compact_partition(part_dir)
+
+
+# ---------- Manifest (resumable ingestion) ----------
+class IngestManifest:
+    """
+    JSON ledger of fetched (zone, granularity, window) ranges, stored in
+    base_dir/_manifest.json as {"windows": {"zone|granularity|start|end": {"fetched_at", "rows"}},
+    "pending_aggregation": [[zone, first, last], ...]}.
+    Re-runs only request windows that are missing or stale. Hourly ranges written
+    but not yet rolled up stay pending until aggregate_from_hourly has succeeded,
+    so a run that dies in between still gets its aggregates on the next run.
+    """
+    def __init__(self, base_dir: Path):
+        self.path = base_dir / MANIFEST_NAME
+        self.entries: dict[str, dict] = {}
+        self.pending: list[list[str]] = []
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            if "windows" in state:
+                self.entries = state["windows"]
+                self.pending = state.get("pending_aggregation", [])
+            else:  # ledger written before pending ranges were tracked
+                self.entries = state
+
+    @staticmethod
+    def key(zone: str, granularity: str, start_iso: str, end_iso: str) -> str:
+        return f"{zone}|{granularity}|{start_iso}|{end_iso}"
+
+    def is_fresh(self, zone: str, granularity: str, start_iso: str, end_iso: str) -> bool:
+        """
+        A window is fresh once it was fetched at least STALE_AFTER past its end;
+        recent windows may still be revised by the API and are fetched again.
+        """
+        entry = self.entries.get(self.key(zone, granularity, start_iso, end_iso))
+        if entry is None:
+            return False
+        return pd.Timestamp(entry["fetched_at"]) >= pd.Timestamp(end_iso) + STALE_AFTER
+
+    def record(self, zone: str, granularity: str, start_iso: str, end_iso: str, rows: int):
+        self.entries[self.key(zone, granularity, start_iso, end_iso)] = {
+            "fetched_at": to_iso(pd.Timestamp.now(tz="UTC").floor("s")),
+            "rows": int(rows),
+        }
+
+    def add_pending(self, zone: str, first: pd.Timestamp, last: pd.Timestamp):
+        """Hourly range written but not yet aggregated."""
+        self.pending.append([zone, to_iso(first), to_iso(last)])
+
+    def pending_aggregation(self) -> List[tuple[str, pd.Timestamp, pd.Timestamp]]:
+        return [(zone, pd.Timestamp(first), pd.Timestamp(last)) for zone, first, last in self.pending]
+
+    def clear_pending(self):
+        self.pending = []
+
+    def save(self):
+        # write-then-rename so an interrupted run never leaves a truncated ledger
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        state = {"windows": self.entries, "pending_aggregation": self.pending}
+        tmp.write_text(json.dumps(state, indent=1, sort_keys=True))
+        tmp.replace(self.path)
 
 
 # ---------- Aggregation (from hourly) ----------
-# --- mude a assinatura para NÃO exigir zones ---
-def aggregate_from_hourly(base_dir: Path):
+AGGREGATES = [("day", "D", "daily"), ("month", "M", "monthly"), ("year", "Y", "yearly")]  # date_trunc unit, period, granularity
+
+ROLLUP_SQL = """
+SELECT
+    date_trunc('{unit}', datetime_utc)       AS datetime_utc,
+    zone,
+    avg(carbon_direct)                       AS carbon_direct,
+    avg(carbon_lifecycle)                    AS carbon_lifecycle,
+    avg(cfe_pct)                             AS cfe_pct,
+    avg(re_pct)                              AS re_pct,
+    avg(CAST(estimated AS DOUBLE))           AS estimated,
+    CAST(NULL AS VARCHAR)                    AS estimation_method,
+    year(date_trunc('{unit}', datetime_utc)) AS year
+FROM read_parquet({source}, hive_partitioning = true, union_by_name = true)
+{where}
+GROUP BY ALL
+"""
+
+def sql_str(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def bucket_range(start: pd.Timestamp, end: pd.Timestamp, period: str) -> tuple[pd.Timestamp, pd.Timestamp]:
+    """Half-open [lo, hi) covering every `period` bucket that overlaps [start, end]."""
+    lo = start.tz_convert(None).to_period(period).start_time.tz_localize("UTC")
+    hi = (end.tz_convert(None).to_period(period) + 1).start_time.tz_localize("UTC")
+    return lo, hi
+
+def merge_ranges(ranges: List[tuple[pd.Timestamp, pd.Timestamp]]) -> List[tuple[pd.Timestamp, pd.Timestamp]]:
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+def range_filter(zone: str, lo: pd.Timestamp, hi: pd.Timestamp) -> str:
+    # the zone/year terms let DuckDB skip whole hive partitions
+    last_year = (hi - pd.Timedelta(microseconds=1)).year
+    return (f"(zone = {sql_str(zone)} AND year BETWEEN {lo.year} AND {last_year}"
+            f" AND datetime_utc >= TIMESTAMPTZ {sql_str(lo.isoformat())}"
+            f" AND datetime_utc < TIMESTAMPTZ {sql_str(hi.isoformat())})")
+
+def aggregate_from_hourly(base_dir: Path,
+                          touched: Optional[List[tuple[str, pd.Timestamp, pd.Timestamp]]] = None):
+    """
+    Build daily/monthly/yearly partitions from hourly with one date_trunc GROUP BY
+    per granularity, run in DuckDB and written with COPY ... PARTITION_BY (zone, year)
+    as new part files, so the hourly history never goes through pandas.
+    With `touched` (the (zone, first, last) ranges returned by ingest_months) only the
+    buckets overlapping those ranges are read and recomputed; without it, everything.
+    """
     import duckdb
-    q = "SELECT * FROM read_parquet($path)"
-    path = str(base_dir / "granularity=hourly/**/data.parquet")
-    hourly = duckdb.query(q, params={"path": path}).to_df()
-    if hourly.empty:
+
+    if touched is not None and not touched:
+        print("Nothing ingested, aggregates are up to date.")
+        return
+    if not any(base_dir.glob("granularity=hourly/zone=*/year=*/*.parquet")):
         print("No hourly data found to aggregate.")
         return
 
-    hourly["datetime_utc"] = pd.to_datetime(hourly["datetime_utc"], utc=True)
-    hourly = hourly.sort_values(["zone","datetime_utc"])
-
-    for freq, gran in [("D", "daily"), ("MS", "monthly"), ("YS", "yearly")]:
-        out_list = []
-        for z, zdf in hourly.groupby("zone"):
-            agg = (zdf.set_index("datetime_utc")
-                      .resample(freq)
-                      .mean(numeric_only=True)
-                      .reset_index())
-            agg["zone"] = z
-            out_list.append(agg)
-
-        merged = pd.concat(out_list, ignore_index=True)
-        cols = ["datetime_utc","zone","carbon_direct","carbon_lifecycle","cfe_pct","re_pct","estimated","estimation_method"]
-        for c in cols:
-            if c not in merged.columns:  # segurança
-                merged[c] = pd.NA
-
-        upsert_parquet(merged[cols], base_dir, granularity=gran)
-        print(f"Aggregated {gran}: {len(merged)} rows")
+    by_zone: dict[str, list] = {}
+    for zone, first, last in touched or []:
+        by_zone.setdefault(zone, []).append((first, last))
+    years = {zone: {y for first, last in ranges for y in range(first.year, last.year + 1)}
+             for zone, ranges in by_zone.items()}
+
+    # hourly parts must be de-duplicated before they are averaged
+    if touched is None:
+        compact_partitions(base_dir, "hourly")
+    else:
+        for zone, zone_years in years.items():
+            for y in zone_years:
+                compact_partition(base_dir / f"granularity=hourly/zone={zone}/year={y}")
+
+    con = duckdb.connect()
+    con.execute("SET TimeZone = 'UTC'")  # date_trunc on TIMESTAMPTZ follows the session zone
+    source = sql_str(base_dir / "granularity=hourly/**/*.parquet")
+    for unit, period, gran in AGGREGATES:
+        where = ""
+        if touched is not None:
+            where = "WHERE " + " OR ".join(
+                range_filter(zone, lo, hi)
+                for zone, ranges in by_zone.items()
+                for lo, hi in merge_ranges([bucket_range(first, last, period) for first, last in ranges])
+            )
+        query = ROLLUP_SQL.format(unit=unit, source=source, where=where)
+        target = sql_str(base_dir / f"granularity={gran}")
+        rows = con.execute(
+            f"COPY ({query}) TO {target} (FORMAT parquet, PARTITION_BY (zone, year), "
+            "WRITE_PARTITION_COLUMNS true, OVERWRITE_OR_IGNORE true, FILENAME_PATTERN 'part-{uuid}')"
+        ).fetchone()[0]
+
+        if touched is None:
+            compact_partitions(base_dir, gran)
+        else:
+            for zone, zone_years in years.items():
+                for y in zone_years:
+                    compact_partition(base_dir / f"granularity={gran}/zone={zone}/year={y}")
+        print(f"Aggregated {gran}: {rows} rows")
+    con.close()
 
 
 
@@ -160,7 +285,10 @@ def aggregate_from_hourly(base_dir: Path):
 # ---------- API ----------
 
 # --- troque a função que chama a API ---
-def fetch_hourly_from_api(zone: str, start_iso: str, end_iso: str) -> pd.DataFrame:
+def fetch_hourly_from_api(zone: str, start_iso: str, end_iso: str,
+                          session: Optional[requests.Session] = None) -> pd.DataFrame:
+    if session is None:
+        session = get_session()
     token = get_api_token()
     headers = {
         # CORRETO: usa 'auth-token' em vez de Authorization: Bearer
@@ -179,9 +307,14 @@ def fetch_hourly_from_api(zone: str, start_iso: str, end_iso: str) -> pd.DataFra
         # opcional: "disableEstimations": "true"
     }
 
+    limiter = get_limiter(token, RATE_PER_SECOND, capacity=RATE_BURST, daily_quota=DAILY_QUOTA)
     for attempt in range(RETRY_MAX):
+        limiter.acquire()
         try:
-            r = requests.get(base_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            r = session.get(base_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            # 429: pause every worker on this key for Retry-After, then try again
+            if limiter.throttled(r, fallback=RETRY_SLEEP * (2 ** attempt)) and attempt < RETRY_MAX - 1:
+                continue
             r.raise_for_status()
             data = r.json()
             if isinstance(data, dict):
@@ -202,20 +335,10 @@ def fetch_hourly_from_api(zone: str, start_iso: str, end_iso: str) -> pd.DataFra
 
 
 
-def ingest_month(zone: str, year: int, month: int, base_dir: Path):
-    start = pd.Timestamp(year=year, month=month, day=1, tz="UTC")
-    month_end_exclusive = (start + pd.offsets.MonthEnd(1)).normalize() + pd.Timedelta(days=1)
-
-    # fatia em janelas de 10 dias (end exclusivo)
-    cur = start
-    collected = []
-    while cur < month_end_exclusive:
-        nxt = min(cur + pd.Timedelta(days=10), month_end_exclusive)
-        raw = fetch_hourly_from_api(zone, cur.isoformat().replace("+00:00","Z"), nxt.isoformat().replace("+00:00","Z"))
-        if not raw.empty:
-            collected.append(raw)
-        cur = nxt
-
+def store_month(zone: str, year: int, month: int, collected: List[pd.DataFrame],
+                base_dir: Path) -> Optional[tuple[pd.Timestamp, pd.Timestamp]]:
+    """Standardize and write one month; returns the (first, last) timestamps written."""
+    collected = [raw for raw in collected if not raw.empty]
     if not collected:
         print(f"[{zone}] No data {year}-{month:02d}")
         return
@@ -224,6 +347,60 @@ def ingest_month(zone: str, year: int, month: int, base_dir: Path):
     std = standardize_columns(raw_all, zone=zone)
     upsert_parquet(std, base_dir, granularity="hourly")
     print(f"[{zone}] Ingested {year}-{month:02d}: {len(std)} rows")
+    if not std.empty:
+        return std["datetime_utc"].iloc[0], std["datetime_utc"].iloc[-1]
+
+
+def ingest_month(zone: str, year: int, month: int, base_dir: Path):
+    # fatia em janelas de 10 dias (end exclusivo)
+    collected = [fetch_hourly_from_api(zone, s, e) for s, e in month_windows(year, month)]
+    store_month(zone, year, month, collected, base_dir)
+
+
+def ingest_months(targets: List[tuple[str, int, int]], base_dir: Path,
+                  max_in_flight: int = MAX_IN_FLIGHT,
+                  manifest: Optional[IngestManifest] = None):
+    """
+    Backfill many (zone, year, month) targets. Every 10-day window is fetched
+    concurrently (at most max_in_flight requests at once, sharing one connection
+    pool); each month is written as soon as all of its windows are back.
+    A failing month is reported and skipped, like the sequential runner did.
+    Returns the (zone, first, last) ranges written, for aggregate_from_hourly.
+    With a manifest, windows it already holds as fresh are not requested again,
+    and each written month is recorded so an interrupted backfill can resume;
+    its range is also queued in the manifest for aggregation.
+    """
+    session = get_session(max_in_flight)
+    touched = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        pending = {}
+        for zone, year, month in targets:
+            windows = month_windows(year, month)
+            if manifest is not None:
+                windows = [w for w in windows if not manifest.is_fresh(zone, "hourly", *w)]
+            if windows:
+                pending[(zone, year, month)] = [
+                    ((s, e), pool.submit(fetch_hourly_from_api, zone, s, e, session)) for s, e in windows
+                ]
+        if len(pending) < len(targets):
+            print(f"Skipping {len(targets) - len(pending)} months already in the manifest")
+
+        for (zone, year, month), jobs in pending.items():
+            try:
+                frames = [f.result() for _, f in jobs]
+                span = store_month(zone, year, month, frames, base_dir)
+            except Exception as e:
+                print(f"Failed {zone} {year}-{month:02d}: {e}")
+                continue
+            if span is not None:
+                touched.append((zone, *span))
+            if manifest is not None:
+                if span is not None:
+                    manifest.add_pending(zone, *span)
+                for ((s, e), _), raw in zip(jobs, frames):
+                    manifest.record(zone, "hourly", s, e, len(raw))
+                manifest.save()
+    return touched
 
 
 
@@ -233,14 +410,13 @@ if __name__ == "__main__":
     ZONES = ["US-FLA-FPL", "US-GA-GA", "US-CA-CISO", "US-NY-NYIS", "FR", "BR"]
     YEARS = [2021, 2022, 2023, 2024]
 
-    for z in ZONES:
-        for y in YEARS:
-            for m in range(1, 13):
-                try:
-                    ingest_month(z, y, m, BASE_DIR)
-                except Exception as e:
-                    print(f"Failed {z} {y}-{m:02d}: {e}")
+    targets = [(z, y, m) for z in ZONES for y in YEARS for m in range(1, 13)]
+    manifest = IngestManifest(BASE_DIR)
+    ingest_months(targets, BASE_DIR, max_in_flight=MAX_IN_FLIGHT, manifest=manifest)
 
-    # build daily/monthly/yearly locally from hourly
-    aggregate_from_hourly(BASE_DIR)
+    # build daily/monthly/yearly locally from hourly: the periods just ingested plus any
+    # left pending by an earlier run that stopped before its aggregation finished
+    aggregate_from_hourly(BASE_DIR, touched=manifest.pending_aggregation())
+    manifest.clear_pending()
+    manifest.save()
     print("Done.")
@@ -1,24 +1,25 @@
 #%%
 import pandas as pd
-daily_2024 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_daily.csv')
-hourly_2024 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_hourly.csv')
-monthly_2024 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_monthly.csv')
-yearly_2024 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_yearly.csv')
-
-daily_2023 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_daily.csv')
-hourly_2023 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_hourly.csv')
-monthly_2023 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_monthly.csv')
-yearly_2023 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_yearly.csv')
-
-daily_2022 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_daily.csv')
-hourly_2022 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_hourly.csv')
-monthly_2022 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_monthly.csv')
-yearly_2022 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_yearly.csv')
-
-daily_2021 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_daily.csv')
-hourly_2021 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_hourly.csv')
-monthly_2021 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_monthly.csv')
-yearly_2021 = pd.read_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_yearly.csv')
+from schema import read_em_csv  # declared dtypes + pyarrow engine
+daily_2024 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_daily.csv')
+hourly_2024 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_hourly.csv')
+monthly_2024 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_monthly.csv')
+yearly_2024 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2024_yearly.csv')
+
+daily_2023 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_daily.csv')
+hourly_2023 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_hourly.csv')
+monthly_2023 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_monthly.csv')
+yearly_2023 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2023_yearly.csv')
+
+daily_2022 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_daily.csv')
+hourly_2022 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_hourly.csv')
+monthly_2022 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_monthly.csv')
+yearly_2022 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2022_yearly.csv')
+
+daily_2021 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_daily.csv')
+hourly_2021 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_hourly.csv')
+monthly_2021 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_monthly.csv')
+yearly_2021 = read_em_csv('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/US-FLA-FPL_2021_yearly.csv')
 
 #%%
 daily_2021
@@ -51,17 +52,16 @@ for name, df in combined.items():
 
 #%%
 
-import pandas as pd
+import carbon_store
 
-df = pd.read_parquet(
-    r"C:\Users\leona\Desktop\Masters\Data Mungin\Second group Project\data\granularity=hourly\zone=US-FLA-FPL\year=2022\data.parquet",
-    engine="pyarrow"
-)
+# lazy scan of data/: only the FL 2022 partition is read
+df = carbon_store.open("hourly", zones=["US-FLA-FPL"], start="2022-01-01", end="2023-01-01").df()
 print(df.head())
 
 #%%
 import pandas as pd
 from pathlib import Path
+from schema import read_em_csv
 
 # base folder for California (with / instead of \)
 base_path = Path("C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/NY")
@@ -77,7 +77,7 @@ for freq in freqs:
     for year in years:
         file_path = base_path / f"US-NY-NYIS_{year}_{freq}.csv"
         print(f"Reading: {file_path}")
-        df = pd.read_csv(file_path)
+        df = read_em_csv(file_path)
         
         # (optional) add metadata columns
         df["year"] = year
@@ -99,32 +99,9 @@ ca_yearly = ca_data["yearly"]
 ca_hourly = ca_data["hourly"]
 
 #%%
-import pandas as pd
-from pathlib import Path
-
-base_path = Path("C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/NY")
-
-years = [2021, 2022, 2023, 2024]
-freqs = ["daily", "monthly", "yearly", "hourly"]
-
-cleaned_path = base_path / "cleaned"
-cleaned_path.mkdir(exist_ok=True)
-
-for freq in freqs:
-    frames = []
-    for year in years:
-        file_path = base_path / f"US-NY-NYIS_{year}_{freq}.csv"
-        print(f"Reading: {file_path}")
-        df = pd.read_csv(file_path)
-        df["year"] = year
-        df["frequency"] = freq
-        df["region"] = "US-NY-NYIS"
-        frames.append(df)
-
-    final_df = pd.concat(frames, ignore_index=True)
-    final_df.to_csv(cleaned_path / f"{freq}.csv", index=False)
-    print(f"Saved: {cleaned_path/f'{freq}.csv'}")
-
+# NOTE: datasets/<REGION>/cleaned/{freq}.csv is no longer an input of the big_*
+# build (see consolidate.py); use consolidate_all(..., write_cleaned=True) to
+# regenerate it for debugging.
 
 #%%
 
@@ -141,67 +118,20 @@ regions = {
 
 frequencies = ["hourly", "daily", "monthly", "yearly"]
 
+from consolidate import consolidate_all
 
-rename_map = {
-    "Datetime (UTC)": "datetime_utc",
-    "Country": "country",
-    "Zone name": "zone_name",
-    "Zone id": "zone_id",
-    "Carbon intensity gCO₂eq/kWh (direct)": "carbon_intensity_direct",
-    "Carbon intensity gCO₂eq/kWh (Life cycle)": "carbon_intensity_lifecycle",
-    "Carbon-free energy percentage (CFE%)": "cfe_pct",
-    "Renewable energy percentage (RE%)": "re_pct",
-    "Data source": "data_source",
-    "Data estimated": "data_estimated",
-    "Data estimation method": "data_estimation_method",
-}
-
-
-output_dir = BASE_DIR / "big"
-output_dir.mkdir(exist_ok=True)
-
-big_dfs = {}
-
-for freq in frequencies:
-    frames = []
-    for region_id, folder in regions.items():
-        file_path = BASE_DIR / folder / "cleaned" / f"{freq}.csv"
-        print(f"Reading: {file_path}")
-        df = pd.read_csv(file_path)
-
-        
-        df = df.rename(columns=rename_map)
-
-
-        if "region" not in df.columns:
-            df["region"] = region_id
-
-        
-        if "frequency" not in df.columns:
-            df["frequency"] = freq
-
-    
-        if "year" not in df.columns:
-        
-            df["year"] = pd.to_datetime(df["datetime_utc"]).dt.year
-
-        frames.append(df)
-
-
-    big_df = pd.concat(frames, ignore_index=True)
-
-
-    out_path = output_dir / f"big_{freq}.parquet"
-    big_df.to_parquet(out_path, index=False)
-    print(f"Saved: {out_path}")
-
-    big_dfs[freq] = big_df
+# raw region/year CSVs -> typed datasets/big/frequency=<freq>/region=<zone>/year=<y>/data.parquet,
+# built in this process: a process pool would re-run every cell of this file in each
+# spawned worker (Windows/macOS). For the parallel build run `python consolidate.py`.
+consolidate_all(BASE_DIR, regions, frequencies, workers=1)
 
 print("Done")
 
 #%%
-import pandas as pd
-daily = pd.read_parquet('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/datasets/big/big_monthly.parquet')
+import carbon_store
+# source="big" reads datasets/big/frequency=/region=/year=, which only exists after
+# the consolidate_all cell above has run (the repo ships the old big_*.parquet files)
+daily = carbon_store.load("monthly", source="big")
 daily.head
 #%%
 
@@ -210,39 +140,27 @@ import pandas as pd
 df = pd.read_csv("/Users/muhammedaltindal/Data-Munging-II-v2-2/weather_2021-01-01_2021-03-31.csv")
 df
 # %%
-import pandas as pd
-df = pd.read_parquet("datasets\big\big_daily.parquet")
+import carbon_store
+# needs the consolidate_all cell to have been run first (see above)
+df = carbon_store.load("daily", source="big")
 df.head(), df.tail(), df.shape
 
 #%%
-import pandas as pd
-
-df = pd.read_parquet("weather_daily.parquet")
+import weather_store
 
-# drop the bad helper column
-if "0" in df.columns:
-    df = df.drop(columns=["0"])
-
-# drop the broken first row (where date is NaN)
-df = df.dropna(subset=["date"])
+# partitioned weather store (weather/granularity=daily/region=/year=); the legacy
+# weather_daily.parquet and fl_/ny_/cal_*.parquet files go in once with
+# weather_store.import_legacy(), which also drops the "0" helper column and NaN dates
+df = weather_store.load("daily")
 #%%
 import pandas as pd
 df = pd.read_parquet("cal_2021.parquet")
 print(df.head(), df.tail(), df.shape)
 
 #%%
-import pandas as pd
-
-# Carregar os três arquivos Parquet
-df1 = pd.read_parquet('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/jan_oct_2022.parquet')
-df2 = pd.read_parquet('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/weather_daily.parquet')
-# df3 = pd.read_parquet('C:/Users/leona/Desktop/Masters/Data Mungin/Second group Project/dec_2021.parquet')
-
-# Concatenar os DataFrames
-df_completo = pd.concat([df1, df2], ignore_index=True)
-
-# Opcional: salvar o resultado em um novo arquivo Parquet
-df_completo.to_parquet('fl_2022.parquet')
+# NOTE: fl_2022.parquet used to be stitched here from jan_oct_2022.parquet and
+# weather_daily.parquet with pd.concat. New weather days are appended to the
+# partitioned store instead (weather_data.py -> weather_store.write_rows).
 #%%
 df_provider = pd.read_excel(
     "C:\\Users\\leona\\Desktop\\Masters\\Data Mungin\\Second group Project\\EDS\\by_sector_by_provider.xlsx"
@@ -0,0 +1,54 @@
+# partitions.py
+"""
+Append-only partition directories, shared by ingest.py (carbon) and
+weather_store.py (weather):
+
+    <partition>/data.parquet               compacted rows
+    <partition>/part-<first>_<last>.parquet  rows appended since, one file per write
+
+A write adds a part file instead of rewriting data.parquet, so its cost does not
+grow with the partition. Once COMPACT_AFTER parts pile up, the partition is
+compacted: everything is merged into data.parquet, de-duplicated on the row key
+with the newest file winning.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Sequence
+
+import pandas as pd
+
+
+# ---------- Config ----------
+COMPACT_AFTER = 24               # part files per partition before compaction
+
+
+def write_part(part_dir: Path, df: pd.DataFrame, span: str, keys: Sequence[str]):
+    """
+    Add `df` as part-<span>.parquet (writing the same span again replaces it) and
+    compact the partition once it holds COMPACT_AFTER parts. keys[0] is the time column.
+    """
+    part_dir.mkdir(parents=True, exist_ok=True)
+    df.sort_values(keys[0]).to_parquet(part_dir / f"part-{span}.parquet", index=False)
+    if len(list(part_dir.glob("part-*.parquet"))) >= COMPACT_AFTER:
+        compact_partition(part_dir, keys)
+
+def compact_partition(part_dir: Path, keys: Sequence[str]):
+    """
+    Merge data.parquet and the part files of one partition into a single
+    data.parquet, de-duplicated on `keys` and sorted by keys[0]. The newest file
+    wins, so refetched rows replace what was stored before.
+    """
+    parts = sorted(part_dir.glob("part-*.parquet"), key=lambda p: (p.stat().st_mtime_ns, p.name))
+    if not parts:
+        return
+    out = part_dir / "data.parquet"
+    files = ([out] if out.exists() else []) + parts
+    merged = (pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+              .drop_duplicates(subset=list(keys), keep="last")
+              .sort_values(keys[0]))
+    # replace data.parquet first; leftover parts after a crash are only duplicates
+    tmp = part_dir / "data.parquet.tmp"
+    merged.to_parquet(tmp, index=False)
+    tmp.replace(out)
+    for p in parts:
+        p.unlink()
@@ -4,8 +4,12 @@ import requests
 import pandas as pd
 from dotenv import load_dotenv
 
+from rate_limit import get_limiter
+
 load_dotenv()
 REQUEST_TIMEOUT = 40
+RATE_PER_SECOND = 5    # same budget as ingest.py (the bucket is shared per key)
+RATE_BURST = 10
 
 def get_api_token() -> str:
     token = os.getenv("EM_API_TOKEN", "").strip()
@@ -21,6 +25,7 @@ def zone_quickcheck(zones: list[str]) -> dict[str, str]:
     token = get_api_token()
     # ElectricityMaps usa este header (não Bearer):
     headers = {"auth-token": token, "Accept": "application/json"}
+    limiter = get_limiter(token, RATE_PER_SECOND, capacity=RATE_BURST)
     base_url = "https://api.electricitymaps.com/v3/carbon-intensity/past-range"
 
     start = pd.Timestamp("2023-01-01", tz="UTC")
@@ -35,7 +40,9 @@ def zone_quickcheck(zones: list[str]) -> dict[str, str]:
             "temporalGranularity": "hourly",
         }
         try:
+            limiter.acquire()
             r = requests.get(base_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            limiter.throttled(r)  # a 429 pauses the next zones for Retry-After
             res[z] = "OK" if r.ok else f"HTTP {r.status_code}"
         except Exception as e:
             res[z] = f"ERR {type(e).__name__}"
@@ -0,0 +1,215 @@
+# rate_limit.py
+"""
+Token-bucket rate limiting shared by the HTTP collectors
+(ingest.py, weather_data.py, quickcheck.py).
+
+There is one bucket per API key, so every worker thread that uses the same key
+draws from the same budget. A bucket has:
+- a refill rate (requests per second) and a burst capacity,
+- an optional daily quota (reset at 00:00 UTC), optionally persisted to disk
+  so that several runs on the same day share it (each run adds its own requests
+  to the stored count under a lock file),
+- a pause window set from the server's Retry-After header after a 429.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# ---------- Config ----------
+LOCK_TIMEOUT = 10.0              # seconds; an older lock file is left over from a crashed run
+
+
+class QuotaExhausted(RuntimeError):
+    """The daily quota of an API key is used up."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date. Returns seconds to wait."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _utc_today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _key_id(api_key: str) -> str:
+    # never write the key itself to disk
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Cross-process lock: exclusive creation of `path` (works on every OS, unlike fcntl)."""
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime > LOCK_TIMEOUT:
+                    path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        path.unlink(missing_ok=True)
+
+
+class TokenBucket:
+    def __init__(self, key_id: str, rate: float, capacity: Optional[float] = None,
+                 daily_quota: Optional[int] = None, state_path: Optional[Path] = None):
+        """
+        Args:
+            key_id: Stable, non-secret id of the API key (used in the state file)
+            rate: Sustained requests per second
+            capacity: Burst size (defaults to one second worth of requests)
+            daily_quota: Max requests per UTC day, None for unlimited
+            state_path: JSON file where the daily usage is persisted
+        """
+        self.key_id = key_id
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.daily_quota = daily_quota
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day = _utc_today()
+        self._used_today = self._load_usage()
+        self._saved = self._used_today   # part of _used_today already in the state file
+
+    # ---- daily quota ----
+    def _read_state(self) -> dict:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        try:
+            return json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _load_usage(self, state: Optional[dict] = None) -> int:
+        entry = (self._read_state() if state is None else state).get(self.key_id, {})
+        return int(entry.get("used", 0)) if entry.get("day") == self._day else 0
+
+    def _save_usage(self):
+        """
+        Add the requests made since the last save to the stored count (other runs
+        may have added theirs meanwhile) and adopt the total, under a lock file.
+        """
+        if self.state_path is None:
+            return
+        with _file_lock(self.state_path.with_name(self.state_path.name + ".lock")):
+            state = self._read_state()
+            total = self._load_usage(state) + self._used_today - self._saved
+            state[self.key_id] = {"day": self._day, "used": total}
+            tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+            tmp.write_text(json.dumps(state, indent=2))
+            tmp.replace(self.state_path)
+        self._used_today = self._saved = total
+
+    def remaining_today(self) -> Optional[int]:
+        if self.daily_quota is None:
+            return None
+        with self._lock:
+            self._roll_day()
+            return max(0, self.daily_quota - self._used_today)
+
+    def _roll_day(self):
+        today = _utc_today()
+        if today != self._day:
+            self._day = today
+            self._used_today = self._saved = 0
+
+    # ---- tokens ----
+    def acquire(self):
+        """Block until one request may be sent. Raises QuotaExhausted when the daily quota is spent."""
+        while True:
+            with self._lock:
+                self._roll_day()
+                if self.daily_quota is not None and self._used_today >= self.daily_quota:
+                    raise QuotaExhausted(
+                        f"Daily quota of {self.daily_quota} requests used up for key {self.key_id}."
+                    )
+                now = time.monotonic()
+                # nothing accrues while paused: refill from the end of the pause
+                elapsed = max(0.0, now - max(self._updated, self._paused_until))
+                self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+                self._updated = now
+
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._used_today += 1
+                        self._save_usage()
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (all threads sharing this key)."""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+
+    def throttled(self, response, fallback: float = 1.0) -> bool:
+        """
+        Inspect a response. On 429 pause the bucket for Retry-After (or `fallback`
+        seconds when the header is missing) and return True so the caller retries.
+        """
+        if response.status_code != 429:
+            return False
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        self.pause(fallback if delay is None else delay)
+        return True
+
+
+# ---------- Registry (one bucket per API key) ----------
+_buckets: Dict[str, TokenBucket] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(api_key: str, rate: float, capacity: Optional[float] = None,
+                daily_quota: Optional[int] = None, state_path: Optional[Path] = None) -> TokenBucket:
+    """
+    Return the shared bucket for `api_key`, creating it on first use.
+    Settings passed on later calls for the same key are ignored.
+    """
+    key_id = _key_id(api_key)
+    with _registry_lock:
+        bucket = _buckets.get(key_id)
+        if bucket is None:
+            bucket = TokenBucket(key_id, rate, capacity=capacity,
+                                 daily_quota=daily_quota, state_path=state_path)
+            _buckets[key_id] = bucket
+        return bucket
@@ -0,0 +1,165 @@
+# schema.py
+"""
+Column resolution for Electricity Maps data (API responses and CSV exports).
+
+A SchemaAdapter maps one header signature onto a target schema. The plan
+(which source column feeds which target, and how it is converted) is resolved
+once per distinct header and cached, so every chunk of a backfill with the same
+header reuses it and only pays for the vectorized conversions.
+"""
+from __future__ import annotations
+import csv
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# (target, kind, candidate source headers) -- candidates are normalized like the headers
+Targets = Tuple[Tuple[str, str, Tuple[str, ...]], ...]
+
+DATETIME_CANDIDATES = ("datetime", "datetime_utc", "time", "timestamp", "utc_datetime", "datetime_(utc)", "date")
+
+# ingest.py schema: datetime_utc | zone | carbon_direct | carbon_lifecycle | cfe_pct | re_pct | estimated | estimation_method
+CARBON_TARGETS: Targets = (
+    ("carbon_direct", "float", ("carbon_intensity", "carbon_intensity_gco2eq/kwh",
+                                "carbon_intensity_gco₂eq/kwh_(direct)", "carbonintensity", "direct")),
+    ("carbon_lifecycle", "float", ("lifecycle", "carbon_intensity_gco2eq/kwh_(life_cycle)",
+                                   "carbon_intensity_gco₂eq/kwh_(life_cycle)", "life_cycle", "lifecycle_intensity")),
+    ("cfe_pct", "float", ("cfe", "cfe_%", "carbon-free_energy_percentage",
+                          "carbon-free_energy_percentage_(cfe%)")),
+    ("re_pct", "float", ("re", "re_%", "renewable_energy_percentage",
+                         "renewable_energy_percentage_(re%)")),
+    ("estimated", "bool", ("estimated", "data_estimated")),
+    ("estimation_method", "str", ("estimation_method", "data_estimation_method", "estimation")),
+)
+
+# main.py schema for the Electricity Maps CSV exports (big_* datasets),
+# typed compactly because all regions x years are held at once
+EM_CSV_TARGETS: Targets = (
+    ("country", "category", ("country",)),
+    ("zone_name", "category", ("zone_name",)),
+    ("zone_id", "category", ("zone_id",)),
+    ("carbon_intensity_direct", "float32", ("carbon_intensity_gco₂eq/kwh_(direct)",
+                                            "carbon_intensity_gco2eq/kwh_(direct)")),
+    ("carbon_intensity_lifecycle", "float32", ("carbon_intensity_gco₂eq/kwh_(life_cycle)",
+                                               "carbon_intensity_gco2eq/kwh_(life_cycle)")),
+    ("cfe_pct", "float32", ("carbon-free_energy_percentage_(cfe%)",)),
+    ("re_pct", "float32", ("renewable_energy_percentage_(re%)",)),
+    ("data_source", "category", ("data_source",)),
+    ("data_estimated", "bool", ("data_estimated", "estimated")),
+    ("data_estimation_method", "str", ("data_estimation_method", "estimation_method")),
+)
+
+# kind -> dtype used when a file is read with its declared schema
+PANDAS_DTYPES = {"float": "float64", "float32": "float32", "bool": "boolean",
+                 "category": "category", "str": "string"}
+ARROW_TYPES = {"float": pa.float64(), "float32": pa.float32(), "bool": pa.bool_(),
+               "category": pa.dictionary(pa.int32(), pa.string()), "str": pa.string()}
+
+TRUE_VALUES = ("1", "true", "yes", "sim", "y")
+
+
+def normalize_header(name) -> str:
+    return re.sub(r"[()]", "", str(name).strip().lower().replace(" ", "_"))
+
+
+def to_bool(col: pd.Series) -> pd.Series:
+    """Boolean-ish column -> bool. Text is compared once per distinct value, not per row."""
+    if pd.api.types.is_bool_dtype(col):
+        return col.fillna(False).astype(bool)    # nullable "boolean" may hold NA
+    if pd.api.types.is_numeric_dtype(col):
+        return col.fillna(0).astype(bool)        # 1.0 / 0.0 flags, not compared as text
+    codes, uniques = pd.factorize(col)
+    if len(uniques) == 0:        # empty or all-null column
+        return pd.Series(False, index=col.index)
+    flags = np.append(pd.Index(uniques).astype(str).str.lower().isin(TRUE_VALUES), False)
+    return pd.Series(flags[codes], index=col.index)   # code -1 (null) picks the trailing False
+
+
+class SchemaAdapter:
+    """Resolved column plan for one header signature. Build it with SchemaAdapter.for_header."""
+
+    def __init__(self, header: Sequence[str], targets: Targets = CARBON_TARGETS):
+        lookup: Dict[str, str] = {}
+        for name in header:
+            lookup.setdefault(normalize_header(name), name)
+
+        # detect datetime-ish column
+        dt = next((normalize_header(c) for c in DATETIME_CANDIDATES if normalize_header(c) in lookup), None)
+        if dt is None:
+            dt = next((c for c in lookup if "date" in c or "time" in c), None)
+        if dt is None:
+            raise ValueError("No datetime-like column found.")
+        self.datetime_source = lookup[dt]
+
+        self.kinds: Dict[str, str] = {}
+        self.sources: Dict[str, Optional[str]] = {}
+        for target, kind, candidates in targets:
+            found = next((normalize_header(c) for c in candidates if normalize_header(c) in lookup), None)
+            self.kinds[target] = kind
+            self.sources[target] = lookup[found] if found is not None else None
+
+    @classmethod
+    def for_header(cls, header: Sequence[str], targets: Targets = CARBON_TARGETS) -> "SchemaAdapter":
+        return _cached_adapter(tuple(header), targets)
+
+    @property
+    def rename_map(self) -> Dict[str, str]:
+        """Source -> target names, for callers that keep the remaining columns as they are."""
+        renames = {self.datetime_source: "datetime_utc"}
+        renames.update({src: target for target, src in self.sources.items() if src is not None})
+        return renames
+
+    def apply(self, df: pd.DataFrame, zone: str) -> pd.DataFrame:
+        """Project `df` onto the target schema with typed conversions, sorted by datetime_utc."""
+        out = pd.DataFrame({
+            "datetime_utc": pd.to_datetime(df[self.datetime_source], utc=True, errors="coerce"),
+            "zone": zone,
+        })
+        for target, kind in self.kinds.items():
+            src = self.sources[target]
+            if kind in ("float", "float32"):
+                out[target] = (pd.to_numeric(df[src], errors="coerce") if src is not None
+                               else np.nan)
+                out[target] = out[target].astype(PANDAS_DTYPES[kind])
+            elif kind == "bool":
+                out[target] = to_bool(df[src]) if src is not None else False
+            elif kind == "category":
+                out[target] = df[src].astype("category") if src is not None else pd.NA
+            else:
+                out[target] = df[src] if src is not None else pd.NA
+
+        return out.dropna(subset=["datetime_utc"]).sort_values("datetime_utc").reset_index(drop=True)
+
+
+@lru_cache(maxsize=64)
+def _cached_adapter(header: Tuple[str, ...], targets: Targets) -> SchemaAdapter:
+    return SchemaAdapter(header, targets)
+
+
+# ---------- Electricity Maps CSV exports ----------
+def read_csv_header(path: Path) -> List[str]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f))
+
+
+def read_em_csv(path: Path, rename: bool = False) -> pd.DataFrame:
+    """
+    Read an Electricity Maps CSV export with its declared schema through the pyarrow
+    engine: float32 metrics, categorical zone/country/source, boolean estimated flag
+    and a UTC timestamp parsed at read time. rename=True applies the big_* names.
+    """
+    header = read_csv_header(path)
+    adapter = SchemaAdapter.for_header(tuple(header), EM_CSV_TARGETS)
+    dtypes = {src: PANDAS_DTYPES[adapter.kinds[target]]
+              for target, src in adapter.sources.items() if src is not None}
+    dt_col = adapter.datetime_source
+    df = pd.read_csv(path, engine="pyarrow", dtype=dtypes, parse_dates=[dt_col])
+    if df[dt_col].dt.tz is None:
+        df[dt_col] = df[dt_col].dt.tz_localize("UTC")
+    return df.rename(columns=adapter.rename_map) if rename else df
@@ -0,0 +1,120 @@
+# weather_cache.py
+"""
+Persistent cache of OpenWeather responses (one SQLite file).
+
+Entries are keyed on the endpoint plus its query parameters; the API key
+(appid) is left out, so the cache is shared by every key and never stores it.
+- day summaries of past dates are final and never expire,
+- recent dates expire after a TTL,
+- the file is capped in size, evicting the least recently used entries.
+
+A cache hit costs no API call and no token from the rate limiter.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+
+# ---------- Config ----------
+CACHE_PATH = Path(".weather_cache.sqlite")
+MAX_BYTES = 256 * 2**20          # size cap of the stored response bodies
+RECENT_TTL = 6 * 3600            # seconds, for dates that may still be revised
+FINAL_AFTER = timedelta(days=2)  # a day summary is final this long after the day (UTC)
+EXCLUDED_PARAMS = ("appid",)
+
+
+def cache_key(endpoint: str, params: dict) -> str:
+    items = sorted((k, str(v)) for k, v in params.items() if k not in EXCLUDED_PARAMS)
+    return hashlib.sha256(json.dumps([endpoint, items]).encode()).hexdigest()
+
+
+def day_ttl(day: date) -> Optional[float]:
+    """TTL for the data of `day`: None (never expires) once the day is final."""
+    if datetime.now(timezone.utc).date() - day >= FINAL_AFTER:
+        return None
+    return RECENT_TTL
+
+
+class ResponseCache:
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")   # concurrent runs can share the file
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL,            -- NULL: never expires
+                last_used REAL NOT NULL
+            )
+        """)
+        self._con.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, endpoint: str, params: dict) -> Optional[dict]:
+        """Cached JSON body, or None when missing or expired."""
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._con.execute(
+                "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._con.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._con.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(body)
+
+    def put(self, endpoint: str, params: dict, data: dict, ttl: Optional[float]):
+        """Store a successful response; ttl=None keeps it until evicted for size."""
+        body = json.dumps(data)
+        now = time.time()
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(endpoint, params), endpoint, body, len(body), now,
+                 None if ttl is None else now + ttl, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._con.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total = self._con.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._con.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._con.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def close(self):
+        self._con.close()
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache on CACHE_PATH, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
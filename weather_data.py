@@ -1,9 +1,15 @@
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
+from pathlib import Path
 import requests
 import pandas as pd
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from rate_limit import QuotaExhausted, get_limiter
+import weather_store
+from weather_cache import day_ttl, get_response_cache
 
 
 def configure():
@@ -20,7 +26,23 @@ REGIONS = {
     "US-NY-NYIS": {"name": "New York City", "lat": 40.71, "lon": -74.01},
 }
 
-OUTPUT_PARQUET = "weather_daily.parquet"
+LEGACY_PARQUETS = weather_store.LEGACY_FILES  # single files not yet imported into the store
+BACKFILL_START = date(2021, 1, 1)
+
+# OpenWeather One Call limits (shared by every script using the same key)
+CALLS_PER_SECOND = 1.0
+DAILY_QUOTA = 1000
+QUOTA_STATE = Path(".rate_limit_state.json")  # daily usage survives restarts
+RETRY_MAX = 3
+DAY_SUMMARY_URL = "https://api.openweathermap.org/data/3.0/onecall/day_summary"
+TIMEMACHINE_URL = "https://api.openweathermap.org/data/3.0/onecall/timemachine"
+MAX_WORKERS = 8                               # concurrent (region, day/hour) requests
+
+# Hourly mode: one timemachine call per (region, hour), stored on the UTC hour
+# grid of ingest.py's datetime_utc as float32 columns
+MODE = "daily"                                # "daily" or "hourly"
+HOURLY_FIELDS = ("temp", "feels_like", "humidity", "pressure", "dew_point",
+                 "clouds", "wind_speed", "wind_deg")
 
 
 def generate_date_range(start_date: date, end_date: date):
@@ -30,13 +52,19 @@ def generate_date_range(start_date: date, end_date: date):
         d += timedelta(days=1)
 
 
-def fetch_daily_summary(api_key: str, lat: float, lon: float, day: date, session=None):
-    """Fetch one day of weather data (daily aggregation)."""
-    if session is None:
-        session = requests.Session()
+def make_session(max_workers: int = MAX_WORKERS) -> requests.Session:
+    """Keep-alive session with a connection pool sized for the worker threads."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+    return session
+
 
-    url = "https://api.openweathermap.org/data/3.0/onecall/day_summary"
-    params = {
+def get_weather_limiter(api_key: str):
+    return get_limiter(api_key, CALLS_PER_SECOND, daily_quota=DAILY_QUOTA, state_path=QUOTA_STATE)
+
+
+def day_summary_params(api_key: str, lat: float, lon: float, day: date) -> dict:
+    return {
         "lat": lat,
         "lon": lon,
         "date": day.strftime("%Y-%m-%d"),
@@ -44,14 +72,89 @@ def fetch_daily_summary(api_key: str, lat: float, lon: float, day: date, session
         "appid": api_key,
     }
 
-    r = session.get(url, params=params)
+
+def cached_daily_summary(api_key: str, lat: float, lon: float, day: date):
+    """Day summary from the local response cache, or None (no API call)."""
+    return get_response_cache().get(DAY_SUMMARY_URL, day_summary_params(api_key, lat, lon, day))
+
+
+def fetch_daily_summary(api_key: str, lat: float, lon: float, day: date, session=None):
+    """Fetch one day of weather data (daily aggregation), from the local cache when possible."""
+    params = day_summary_params(api_key, lat, lon, day)
+    return fetch_cached_json(api_key, DAY_SUMMARY_URL, params, day_ttl(day), day, session)
+
+
+def fetch_cached_json(api_key: str, url: str, params: dict, ttl, label, session=None):
+    """GET through the response cache and the rate limiter; None on a non-200 answer."""
+    cache = get_response_cache()
+    data = cache.get(url, params)
+    if data is not None:
+        return data
+
+    if session is None:
+        session = requests.Session()
+
+    limiter = get_weather_limiter(api_key)
+    for _ in range(RETRY_MAX):
+        limiter.acquire()
+        r = session.get(url, params=params)
+        if not limiter.throttled(r):
+            break
+
     if r.status_code == 200:
-        return r.json()
+        data = r.json()
+        cache.put(url, params, data, ttl=ttl)
+        return data
 
-    print(f"[WARN] {day} status={r.status_code} msg={r.text[:120]}")
+    print(f"[WARN] {label} status={r.status_code} msg={r.text[:120]}")
     return None
 
 
+# ---------- Hourly mode ----------
+def hour_params(api_key: str, lat: float, lon: float, hour: pd.Timestamp) -> dict:
+    return {
+        "lat": lat,
+        "lon": lon,
+        "dt": int(hour.timestamp()),
+        "units": "metric",
+        "appid": api_key,
+    }
+
+
+def cached_hour(api_key: str, lat: float, lon: float, hour: pd.Timestamp):
+    """Timemachine response from the local response cache, or None (no API call)."""
+    return get_response_cache().get(TIMEMACHINE_URL, hour_params(api_key, lat, lon, hour))
+
+
+def fetch_hour(api_key: str, lat: float, lon: float, hour: pd.Timestamp, session=None):
+    """Fetch the observation of one UTC hour (One Call timemachine)."""
+    params = hour_params(api_key, lat, lon, hour)
+    return fetch_cached_json(api_key, TIMEMACHINE_URL, params, day_ttl(hour.date()), hour, session)
+
+
+def parse_hourly_record(region_id: str, meta: dict, hour: pd.Timestamp, data: dict):
+    # keyed on the requested hour, so rows line up with datetime_utc in ingest.py;
+    # None without an observation, so the hour is not stored and stays missing
+    if not data.get("data"):
+        return None
+    obs = data["data"][0]
+    record = {"datetime_utc": hour, "region": region_id}
+    record.update({field: obs.get(field) for field in HOURLY_FIELDS})
+    return record
+
+
+def generate_hour_range(start_date: date, end_date: date):
+    """UTC hours from start_date 00:00 through end_date 23:00."""
+    return pd.date_range(pd.Timestamp(start_date, tz="UTC"),
+                         pd.Timestamp(end_date, tz="UTC") + pd.Timedelta(hours=23), freq="h")
+
+
+def plan_missing_hours(start_date: date, end_date: date, regions: dict, have: set) -> list:
+    """(hour, region_id, meta) still missing from `have`, in time order (then region order)."""
+    return [(h, region_id, meta) for h in generate_hour_range(start_date, end_date)
+            for region_id, meta in regions.items() if (region_id, h) not in have]
+
+
 def parse_daily_record(region_id: str, meta: dict, day: date, data: dict):
     temperature = data.get("temperature", {})  # from day_summary
     t_min = temperature.get("min")
@@ -74,73 +177,150 @@ def parse_daily_record(region_id: str, meta: dict, day: date, data: dict):
     }
 
 
+def existing_days(paths) -> set:
+    """(region, date) pairs already stored in the given daily weather Parquet files."""
+    have = set()
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        df = pd.read_parquet(path, columns=["region", "date"])
+        have.update(zip(df["region"], pd.to_datetime(df["date"]).dt.date))
+    return have
+
+
+def stored_days(regions: dict, legacy_dir: Path = Path(".")) -> set:
+    """(region, date) pairs in the weather store or in legacy files that were not imported yet."""
+    legacy = sorted(p for g in LEGACY_PARQUETS for p in legacy_dir.glob(g))
+    return weather_store.stored_keys("daily", regions=regions) | existing_days(legacy)
+
+
+def plan_missing_days(start_date: date, end_date: date, regions: dict, have: set) -> list:
+    """(day, region_id, meta) still missing from `have`, in date order (then region order)."""
+    return [(d, region_id, meta) for d in generate_date_range(start_date, end_date)
+            for region_id, meta in regions.items() if (region_id, d) not in have]
+
+
 def fetch_weather_range(
     start_date: date,
     end_date: date,
     regions: dict,
     max_calls: int = 900,
-    sleep_seconds: float = 0.0,
+    max_workers: int = MAX_WORKERS,
 ):
-    """Fetch weather for multiple regions across a date range."""
+    """Fetch weather for multiple regions across a date range (every day, stored or not)."""
+    tasks = plan_missing_days(start_date, end_date, regions, have=set())
+    return fetch_weather_days(tasks, max_calls, max_workers)
+
+
+def fetch_weather_days(tasks: list, max_calls: int = 900, max_workers: int = MAX_WORKERS,
+                       mode: str = "daily"):
+    """
+    Fetch the given (day, region_id, meta) tasks -- (hour, region_id, meta) with mode="hourly".
+    Tasks already in the response cache are served from it; the rest run
+    concurrently on `max_workers` threads. Pacing and the daily quota come from
+    the shared rate limiter, and max_calls caps the calls spent by this run.
+    Rows come back in task order.
+    """
     api_key = configure()
-    session = requests.Session()
-    rows = []
-    calls = 0
+    session = make_session(max_workers)
 
-    for d in generate_date_range(start_date, end_date):
-        for region_id, meta in regions.items():
-            if calls >= max_calls:
-                print(f"[INFO] Max calls reached: {calls}")
-                return rows
-
-            data = fetch_daily_summary(api_key, meta["lat"], meta["lon"], d, session)
-            calls += 1
+    cached, fetch, parse = MODES[mode]
+    results = {i: cached(api_key, meta["lat"], meta["lon"], d)
+               for i, (d, _, meta) in enumerate(tasks)}
+    todo = [i for i, data in results.items() if data is None]
+    if len(todo) < len(tasks):
+        print(f"[INFO] {len(tasks) - len(todo)} of {len(tasks)} requests served from the cache")
 
-            if data is not None:
-                rows.append(parse_daily_record(region_id, meta, d, data))
+    remaining = get_weather_limiter(api_key).remaining_today()
+    budget = max_calls if remaining is None else min(max_calls, remaining)
+    if len(todo) > budget:
+        print(f"[INFO] Max calls reached: {budget} of {len(todo)} requests scheduled")
+        todo = todo[:budget]
 
-            if sleep_seconds > 0:
-                time.sleep(sleep_seconds)
+    calls = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for i in todo:
+            d, _, meta = tasks[i]
+            futures[pool.submit(fetch, api_key, meta["lat"], meta["lon"], d, session)] = i
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            d, region_id, _ = tasks[futures[future]]
+            try:
+                results[futures[future]] = future.result()
+            except QuotaExhausted as e:
+                print(f"[INFO] {e} Calls used: {calls}")
+                for f in futures:
+                    f.cancel()
+                continue
+            except requests.RequestException as e:
+                print(f"[WARN] {d} {region_id} request failed: {e}")
+            calls += 1
 
+    rows = [parse(region_id, meta, d, results[i])
+            for i, (d, region_id, meta) in enumerate(tasks) if results[i] is not None]
+    rows = [row for row in rows if row is not None]
     print(f"[INFO] Done. Calls used: {calls}")
     return rows
 
 
-def append_to_parquet(rows, output_path: str):
-    """Append new rows to Parquet (deduplicate by date+region)."""
+def save_rows(rows, granularity: str = "daily", base_dir: Path = weather_store.BASE_DIR):
+    """Append new rows to the partitioned weather store (no rewrite of what is stored)."""
     if not rows:
         print("[INFO] No rows to save.")
         return
 
-    new_df = pd.DataFrame(rows)
+    df = pd.DataFrame(rows)
+    if granularity == "hourly":
+        df = df.astype({field: "float32" for field in HOURLY_FIELDS})
+    weather_store.write_rows(df, granularity, base_dir)
+    print(f"[INFO] Saved {len(rows)} new rows.")
+
+
+def backfill(start_date: date, end_date: date, regions: dict, max_calls: int = 900):
+    """
+    Fetch only the (region, day) pairs that are not stored yet, up to max_calls
+    (and the daily quota). Run it again on later days to continue where it stopped.
+    """
+    have = stored_days(regions)
+    tasks = plan_missing_days(start_date, end_date, regions, have)
+    print(f"[INFO] {len(tasks)} (region, day) pairs missing between {start_date} and {end_date}")
+    if not tasks:
+        return
+    rows = fetch_weather_days(tasks, max_calls=max_calls)
+    save_rows(rows)
+
+
+def backfill_hourly(start_date: date, end_date: date, regions: dict, max_calls: int = 900):
+    """
+    Hourly counterpart of backfill(): fetch the (region, UTC hour) pairs that are
+    not stored yet. At 24 calls per region and day, the quota covers far fewer
+    days than the daily mode, so keep the range short or run it over several days.
+    """
+    have = weather_store.stored_keys("hourly", regions=regions)
+    tasks = plan_missing_hours(start_date, end_date, regions, have)
+    print(f"[INFO] {len(tasks)} (region, hour) pairs missing between {start_date} and {end_date}")
+    if not tasks:
+        return
+    rows = fetch_weather_days(tasks, max_calls=max_calls, mode="hourly")
+    save_rows(rows, "hourly")
 
-    if os.path.exists(output_path):
-        old_df = pd.read_parquet(output_path)
-        df = pd.concat([old_df, new_df], ignore_index=True)
-        df = df.drop_duplicates(subset=["date", "region"])
-        df.to_parquet(output_path, index=False)
-    else:
-        new_df.to_parquet(output_path, index=False)
 
-    print(f"[INFO] Saved {len(new_df)} new rows.")
+# mode -> (cache lookup, fetch, parse) for fetch_weather_days
+MODES = {
+    "daily": (cached_daily_summary, fetch_daily_summary, parse_daily_record),
+    "hourly": (cached_hour, fetch_hour, parse_hourly_record),
+}
 
 
 def main():
-    start = date(2024, 1, 1)
-    end = date(2024, 12, 31)
-
-    test_regions = {
-        "US-CAL-CISO" : REGIONS["US-CAL-CISO"],
-    }
-
-    rows = fetch_weather_range(
-        start_date=start,
-        end_date=end,
-        regions=test_regions,
-        max_calls=800,
-    )
-
-    append_to_parquet(rows, OUTPUT_PARQUET)
+    # day summaries / hours are complete once the day is over (UTC)
+    yesterday = date.today() - timedelta(days=1)
+    if MODE == "hourly":
+        backfill_hourly(yesterday - timedelta(days=6), yesterday, REGIONS, max_calls=800)
+    else:
+        backfill(BACKFILL_START, yesterday, REGIONS, max_calls=800)
 
 
 if __name__ == "__main__":
@@ -1,84 +1,112 @@
 import os
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
 
 import requests
 import pandas as pd
 from dotenv import load_dotenv
 
-# List of cities we want to query:
-CITIES = ["Los Angeles", "New York", "Tampa"]
+from rate_limit import QuotaExhausted
+from weather_cache import day_ttl
+from weather_data import REGIONS, TIMEMACHINE_URL, fetch_cached_json, generate_date_range
+
+# Cities we want to query -> their region in weather_data.REGIONS (coordinates)
+CITIES = {"Los Angeles": "US-CAL-CISO", "New York": "US-NY-NYIS", "Tampa": "US-FLA-FPL"}
+
+# Days from here up to yesterday are filled in, a quota's worth per run
+START_DATE = date(2021, 1, 1)
+
+# One reading per city and day, taken at this UTC hour (afternoon in the US)
+READING_HOUR_UTC = 18
 
 def configure():
     load_dotenv()
 
 def get_weather_for_day(session, city_name, day):
     """
-    Weather API call for a specific city and day.
-    Adjust this URL according to the endpoint you are actually using.
-    Right now this is using a standard OpenWeather endpoint as an example.
-    If you are using the "historical" endpoint, you may need to add parameters like &dt=...
+    Weather of `city_name` on `day` at READING_HOUR_UTC, from the historical
+    One Call timemachine endpoint (the date is part of the request, so cached
+    responses are per day). Returns the observation dict, or None on an API error.
+    Raises QuotaExhausted when the day's quota is spent.
     """
     api_key = os.getenv("weather_api_key")
     if not api_key:
         raise RuntimeError("weather_api_key not found in the .env file.")
 
-    # TODO: If using a historical endpoint, modify according to your URL requirements.
-    # For now, this is based on the URL shown in your screenshot:
-    url = (
-        f"https://api.openweathermap.org/data/2.5/weather"
-        f"?q={city_name}&units=imperial&appid={api_key}"
-    )
-
-    r = session.get(url)
-    r.raise_for_status()
-    return r.json()
+    meta = REGIONS[CITIES[city_name]]
+    reading = datetime(day.year, day.month, day.day, READING_HOUR_UTC, tzinfo=timezone.utc)
+    params = {"lat": meta["lat"], "lon": meta["lon"], "dt": int(reading.timestamp()),
+              "units": "imperial", "appid": api_key}
+    data = fetch_cached_json(api_key, TIMEMACHINE_URL, params, day_ttl(day),
+                             f"{city_name} {day}", session)
+    if not data or not data.get("data"):
+        return None
+    return data["data"][0]
+
+def saved_days(base_dir: Path = Path(".")) -> set:
+    """
+    (city, ISO date) pairs already saved in weather_<start>_<end>.csv files.
+    A row only counts when its reading was taken on that date (UTC), so rows
+    filled with a reading of another day are requested again.
+    """
+    have = set()
+    for path in base_dir.glob("weather_*.csv"):
+        df = pd.read_csv(path, usecols=["city", "date", "timestamp"])
+        taken = pd.to_datetime(df["timestamp"], unit="s", utc=True).dt.strftime("%Y-%m-%d")
+        df = df[taken == df["date"]]
+        have.update(zip(df["city"], df["date"]))
+    return have
 
 def main():
     configure()
     s = requests.Session()
 
     # ==============================
-    # 1) UPDATE THESE DATES MANUALLY WHENEVER YOU NEED
+    # 1) ONLY MISSING (city, day) PAIRS ARE REQUESTED
     #
-    # Daily quota calculation (for 3 cities):
-    # 1000 total requests - 100 safety buffer = 900 usable requests
-    # 900 / 3 cities = 300 safe days
-    #
-    # EXAMPLE: Choose a range such as 2021-01-01 to 2021-10-28 (around 300 days).
-    #
-    # IMPORTANT: Keep the range below 300 days unless you reduce the number of cities.
+    # Instead of picking a date range that fits the daily quota by hand, every
+    # run requests the days not yet saved in a weather_*.csv file, oldest first,
+    # and stops when the shared rate limiter reports the daily quota as spent.
+    # The next run (e.g. the next day) continues from there.
     # ==============================
-    start_date = date(2021, 1, 1)   # START DATE
-    end_date   = date(2021, 3, 31)  # END DATE (keep within ~300 days)
+    have = saved_days()
+    todo = [(d, city) for d in generate_date_range(START_DATE, date.today() - timedelta(days=1))
+            for city in CITIES if (city, d.isoformat()) not in have]
+    print(f"Missing (city, day) pairs: {len(todo)}")
     # ==============================
 
     rows = []
-    current = start_date
-
-    while current <= end_date:
-        for city in CITIES:
-            data = get_weather_for_day(s, city, current)
-
-            rows.append({
-                "city": city,
-                "date": current.isoformat(),
-                "temp": data["main"]["temp"],
-                "feels_like": data["main"]["feels_like"],
-                "humidity": data["main"]["humidity"],
-                "wind_speed": data["wind"]["speed"],
-                "timestamp": data.get("dt"),  # UNIX timestamp returned by API
-            })
-
-        current += timedelta(days=1)
+    for current, city in todo:
+        try:
+            obs = get_weather_for_day(s, city, current)
+        except QuotaExhausted as e:
+            print(f"Stopping: {e}")
+            break
+        if obs is None:
+            continue
+
+        rows.append({
+            "city": city,
+            "date": current.isoformat(),
+            "temp": obs["temp"],
+            "feels_like": obs["feels_like"],
+            "humidity": obs["humidity"],
+            "wind_speed": obs["wind_speed"],
+            "timestamp": obs.get("dt"),  # UNIX timestamp of the reading
+        })
+
+    if not rows:
+        print("Nothing to save.")
+        return
 
     df = pd.DataFrame(rows)
 
     # Save file with date range included in the name:
-    filename = f"weather_{start_date}_{end_date}.csv"
+    filename = f"weather_{rows[0]['date']}_{rows[-1]['date']}.csv"
     df.to_csv(filename, index=False)
 
     print(f"Saved → {filename}")
-    print(f"Total API calls: {len(rows)}")
+    print(f"Total rows: {len(rows)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,102 @@
+# weather_store.py
+"""
+Hive-partitioned weather dataset, same scheme as ingest.py's carbon data:
+
+    weather/granularity=<daily|hourly>/region=<zone id>/year=<year>/data.parquet
+                                                        /part-<first>_<last>.parquet
+
+Each write adds one part file per region/year named after the rows' time span,
+so saving a day of weather costs O(new rows) instead of rewriting the whole
+history; partitions are compacted like the carbon ones (partitions.py), keyed
+on (time, region).
+
+The legacy single files (weather_daily.parquet, fl_/ny_/cal_*.parquet) are
+brought in once with import_legacy().
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable, Optional
+
+import pandas as pd
+
+import partitions
+
+# ---------- Config ----------
+BASE_DIR = Path("weather")
+TIME_COLUMNS = {                 # granularity -> time column (with region, the row key)
+    "daily": "date",
+    "hourly": "datetime_utc",    # UTC hour, same grid as ingest.py's hourly partitions
+}
+PART_FORMAT = {"daily": "%Y%m%d", "hourly": "%Y%m%dT%H"}
+LEGACY_FILES = ("fl_*.parquet", "ny_*.parquet", "cal_*.parquet", "weather_daily.parquet")
+
+
+# ---------- Helpers ----------
+def partition_dir(base_dir: Path, granularity: str, region: str, year: int) -> Path:
+    return base_dir / f"granularity={granularity}" / f"region={region}" / f"year={year}"
+
+def partition_files(base_dir: Path, granularity: str, regions: Optional[Iterable[str]] = None):
+    region_glob = ["*"] if regions is None else list(regions)
+    return sorted(f for r in region_glob
+                  for f in base_dir.glob(f"granularity={granularity}/region={r}/year=*/*.parquet"))
+
+
+# ---------- Writes ----------
+def write_rows(df: pd.DataFrame, granularity: str = "daily", base_dir: Path = BASE_DIR):
+    """Append rows as one part file per region/year partition (compacting full partitions)."""
+    if df.empty:
+        return
+    time_col = TIME_COLUMNS[granularity]
+    years = pd.to_datetime(df[time_col]).dt.year
+
+    fmt = PART_FORMAT[granularity]
+    for (region, year), part in df.groupby([df["region"], years]):
+        times = pd.to_datetime(part[time_col])
+        span = f"{times.min():{fmt}}_{times.max():{fmt}}"
+        partitions.write_part(partition_dir(base_dir, granularity, region, year), part, span,
+                              [time_col, "region"])
+
+def compact_all(granularity: str = "daily", base_dir: Path = BASE_DIR):
+    for part_dir in sorted(base_dir.glob(f"granularity={granularity}/region=*/year=*")):
+        partitions.compact_partition(part_dir, [TIME_COLUMNS[granularity], "region"])
+
+
+# ---------- Reads ----------
+def stored_keys(granularity: str = "daily", base_dir: Path = BASE_DIR,
+                regions: Optional[Iterable[str]] = None) -> set:
+    """(region, time) pairs already stored; reads only those two columns."""
+    time_col = TIME_COLUMNS[granularity]
+    have = set()
+    for f in partition_files(base_dir, granularity, regions):
+        df = pd.read_parquet(f, columns=["region", time_col])
+        times = pd.to_datetime(df[time_col], utc=granularity != "daily")
+        have.update(zip(df["region"], times.dt.date if granularity == "daily" else times))
+    return have
+
+def load(granularity: str = "daily", regions: Optional[Iterable[str]] = None,
+         base_dir: Path = BASE_DIR) -> pd.DataFrame:
+    """All stored rows (parts not compacted yet included), de-duplicated and time-sorted."""
+    time_col = TIME_COLUMNS[granularity]
+    files = partition_files(base_dir, granularity, regions)
+    if not files:
+        return pd.DataFrame()
+    # data.parquet before the parts of its partition, parts oldest first: newest wins
+    files = sorted(files, key=lambda f: (f.parent, f.name != "data.parquet", f.stat().st_mtime_ns))
+    df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+    return (df.drop_duplicates(subset=[time_col, "region"], keep="last")
+              .sort_values([time_col, "region"]).reset_index(drop=True))
+
+
+# ---------- Legacy files ----------
+def import_legacy(source_dir: Path = Path("."), base_dir: Path = BASE_DIR):
+    """
+    One-off: load weather_daily.parquet and the fl_/ny_/cal_*.parquet files into
+    the daily store, then compact. Rows missing a date (broken helper rows) are dropped.
+    """
+    paths = sorted(p for pattern in LEGACY_FILES for p in source_dir.glob(pattern))
+    for path in paths:
+        df = pd.read_parquet(path)
+        df = df.drop(columns=[c for c in df.columns if c == "0"]).dropna(subset=["date", "region"])
+        print(f"Importing {path} ({len(df)} rows)")
+        write_rows(df, "daily", base_dir)
+    compact_all("daily", base_dir)